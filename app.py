@@ -1,26 +1,21 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import gspread
 import json
-from google.oauth2.service_account import Credentials
-import time
-import re
 
-# ======= CONFIGURATION =======
-SHEET_ID = "188i0tHyaEH_0hkSXfdMXoP1c3quEp54EAyuqmMUgHN0"
-SHEET_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/"
-
-# All client fields as specified
-CLIENT_FIELDS = [
-    "first_name", "last_name", "full_name", "email", "timezone", "address_line_1", 
-    "address_line_2", "city", "state", "postal_code", "country", "ip", "phone", 
-    "source", "date_of_birth", "company_id", "discprofile", "discsales", 
-    "disc_communiction", "leadership_style", "team_dynamics", "conflict_resolution", 
-    "customer_service_approach", "decision_making_style", "workplace_behavior", 
-    "hiring_and_recruitment", "_coaching_and_development"
-]
+from crm_data import (
+    SHEET_URL, CLIENT_FIELDS, safe_get, safe_str, safe_len,
+    validate_client, prepare_client_record, authorize,
+    format_field_value, DATE_DISPLAY_FIELD,
+)
+from crm_storage import BACKEND, get_storage_backend
+from crm_journal import ClientJournal, JournalReplayer
+from crm_store import ClientStore, LRUCache, empty_snapshot, session_memory_bytes
+from crm_similar import profile_matrix, similar_clients
+from crm_segments import SEGMENT_FIELDS, SEGMENT_OPS, SegmentStore, segment_index, segment_key
+from crm_query import SORT_FIELDS, QueryCache, client_labels
 
+# ======= CONFIGURATION =======
 # Field categories for better organization
 FIELD_CATEGORIES = {
     "👤 Personal Information": [
@@ -74,6 +69,12 @@ FIELD_DESCRIPTIONS = {
     "_coaching_and_development": "Coaching and development needs"
 }
 
+# Rendered client profiles kept across reruns and sessions
+PROFILE_CACHE_SIZE = 512
+
+# Segment CSV/JSON exports kept across reruns (each can be megabytes)
+SEGMENT_EXPORT_CACHE_SIZE = 16
+
 # ======= PAGE CONFIGURATION =======
 st.set_page_config(
     page_title="Live CRM Client Profiles",
@@ -176,99 +177,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ======= UTILITY FUNCTIONS =======
-def safe_get(obj, key, default=""):
-    """Safely get a value from object with default"""
-    try:
-        if isinstance(obj, dict):
-            return obj.get(key, default)
-        elif hasattr(obj, key):
-            return getattr(obj, key, default)
-        else:
-            return default
-    except Exception:
-        return default
-
-def safe_str(value, default=""):
-    """Safely convert value to string"""
-    try:
-        if pd.isna(value):
-            return default
-        return str(value).strip()
-    except Exception:
-        return default
-
-def safe_len(obj):
-    """Safely get length of object"""
-    try:
-        return len(obj) if obj is not None else 0
-    except Exception:
-        return 0
-
-def validate_email(email):
-    """Validate email format"""
-    if not email:
-        return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def validate_phone(phone):
-    """Validate phone number"""
-    if not phone:
-        return False
-    # Remove all non-digit characters
-    digits_only = re.sub(r'\D', '', phone)
-    return len(digits_only) >= 7
-
-def append_client_to_sheet(gc, client_data):
-    """Append new client data to Google Sheet"""
-    try:
-        sh = gc.open_by_key(SHEET_ID)
-        
-        # Try to find the worksheet
-        worksheet_names = ["Clients", "Client Data", "Sheet1", "Main", "Data"]
-        worksheet = None
-        
-        for name in worksheet_names:
-            try:
-                worksheet = sh.worksheet(name)
-                break
-            except gspread.exceptions.WorksheetNotFound:
-                continue
-        
-        if not worksheet:
-            # Use the first available worksheet
-            all_worksheets = sh.worksheets()
-            if all_worksheets:
-                worksheet = all_worksheets[0]
-            else:
-                return False, "No worksheets found"
-        
-        # Get current headers
-        try:
-            headers = worksheet.row_values(1)
-        except Exception:
-            headers = CLIENT_FIELDS
-            worksheet.append_row(headers)
-        
-        # Prepare row data
-        row_data = []
-        for field in headers:
-            if field in client_data:
-                value = client_data[field]
-                if isinstance(value, datetime.date):
-                    value = value.strftime('%Y-%m-%d')
-                row_data.append(str(value) if value else "")
-            else:
-                row_data.append("")
-        
-        # Append the row
-        worksheet.append_row(row_data)
-        return True, "Client added successfully!"
-        
-    except Exception as e:
-        return False, f"Error adding client: {str(e)}"
-
 # ======= HEADER =======
 st.markdown("""
 <div class="main-header">
@@ -282,6 +190,7 @@ st.markdown("""
 # ======= SIDEBAR AUTHENTICATION =======
 # Initialize variables
 gc = None
+service_account = None
 auto_refresh = False
 refresh_interval = 60
 
@@ -292,11 +201,8 @@ auth_file = st.sidebar.file_uploader("Upload Service Account JSON", type=["json"
 if auth_file:
     try:
         creds_dict = json.load(auth_file)
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
-        )
-        gc = gspread.authorize(creds)
+        gc = authorize(creds_dict)
+        service_account = creds_dict.get('client_email')
         st.sidebar.success("✅ Connected to Google Sheets!")
         st.sidebar.markdown(f"[📊 Open Sheet]({SHEET_URL})")
     except Exception as e:
@@ -318,221 +224,124 @@ if auto_refresh:
     )
 
 # Manual refresh button
-if st.sidebar.button("🔄 Refresh Now"):
-    st.cache_data.clear()
-    if 'df' in st.session_state:
-        del st.session_state['df']
-    st.rerun()
+refresh_requested = st.sidebar.button("🔄 Refresh Now")
 
 st.sidebar.markdown("---")
 st.sidebar.caption("Built with ❤️ using Streamlit")
 
 # ======= DATA LOADING FUNCTIONS =======
-@st.cache_data(ttl=60)
 def load_live_client_data():
-    """Load live client data from Google Sheets with enhanced error handling"""
-    if not gc:
-        return pd.DataFrame(columns=CLIENT_FIELDS), "No authentication"
-    
-    try:
-        sh = gc.open_by_key(SHEET_ID)
-        
-        # Try to find a worksheet with client data
-        worksheet_names = ["Clients", "Client Data", "Sheet1", "Main", "Data"]
-        worksheet = None
-        
-        # Get all available worksheets
-        try:
-            all_worksheets = sh.worksheets()
-            available_names = [ws.title for ws in all_worksheets]
-            st.sidebar.info(f"Available sheets: {', '.join(available_names)}")
-        except Exception:
-            available_names = []
-        
-        # Try to find the right worksheet
-        for name in worksheet_names:
-            try:
-                worksheet = sh.worksheet(name)
-                st.sidebar.success(f"Using sheet: {name}")
-                break
-            except gspread.exceptions.WorksheetNotFound:
-                continue
-        
-        if not worksheet and all_worksheets:
-            # Use the first available worksheet
-            worksheet = all_worksheets[0]
-            st.sidebar.warning(f"Using first available sheet: {worksheet.title}")
-        
-        if not worksheet:
-            return pd.DataFrame(columns=CLIENT_FIELDS), "No worksheets found"
-        
-        # Get all data
-        try:
-            data = worksheet.get_all_values()
-        except Exception as e:
-            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error reading data: {e}"
-        
-        if not data:
-            return pd.DataFrame(columns=CLIENT_FIELDS), "Sheet is empty"
-        
-        if len(data) < 2:
-            return pd.DataFrame(columns=CLIENT_FIELDS), "No data rows found (only headers or empty)"
-        
-        # Create DataFrame
-        try:
-            headers = data[0]
-            rows = data[1:]
-            df = pd.DataFrame(rows, columns=headers)
-            
-            # Show available columns in sidebar
-            st.sidebar.info(f"Available columns: {', '.join(headers[:10])}{'...' if len(headers) > 10 else ''}")
-        except Exception as e:
-            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error creating DataFrame: {e}"
-        
-        # Ensure all expected columns are present
-        missing_columns = []
-        for col in CLIENT_FIELDS:
-            if col not in df.columns:
-                df[col] = ""
-                missing_columns.append(col)
-        
-        if missing_columns:
-            st.sidebar.warning(f"Missing columns (added as empty): {', '.join(missing_columns[:5])}{'...' if len(missing_columns) > 5 else ''}")
-        
-        # Keep only the fields we want
-        try:
-            df = df[CLIENT_FIELDS].copy()
-        except Exception as e:
-            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error selecting columns: {e}"
-        
-        # Clean data
-        df = clean_client_data(df)
-        
-        # Remove completely empty rows
-        df = df.dropna(how='all')
-        
-        return df, "Success"
-        
-    except Exception as e:
-        error_msg = f"Error loading data: {str(e)[:200]}"
-        return pd.DataFrame(columns=CLIENT_FIELDS), error_msg
-
-def clean_client_data(df):
-    """Clean and format client data with error handling"""
-    if df.empty:
-        return df
+    """Load raw client rows; ClientStore cleans only the rows that changed"""
+    notices = []
+    backend = get_storage_backend(gc)
+    df, load_status = backend.load_raw(notices)
+    return df, load_status, getattr(backend, 'shard_report', []), notices
+
+# ======= PROFILE RENDERING =======
+def build_profile_html(snapshot, row_id):
+    """Header and every field section of one client as a single HTML block"""
+    client_data = snapshot.df.iloc[row_id]
+    full_name = safe_str(safe_get(client_data, 'full_name', 'Unknown Client'))
+    email = safe_str(safe_get(client_data, 'email', 'No email provided'))
+    completeness = snapshot.completeness[row_id]
     
-    try:
-        df_clean = df.copy()
-        
-        # Clean email addresses
-        if 'email' in df_clean.columns:
-            try:
-                df_clean['email'] = df_clean['email'].astype(str).str.lower().str.strip()
-                # Remove invalid emails
-                email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-                df_clean.loc[~df_clean['email'].str.match(email_pattern, na=False), 'email'] = ''
-            except Exception:
-                pass
-        
-        # Clean phone numbers
-        if 'phone' in df_clean.columns:
-            try:
-                df_clean['phone'] = df_clean['phone'].astype(str).str.strip()
-                # Remove non-phone entries
-                df_clean.loc[df_clean['phone'].str.len() < 7, 'phone'] = ''
-            except Exception:
-                pass
-        
-        # Format names
-        name_fields = ['first_name', 'last_name', 'full_name']
-        for field in name_fields:
-            if field in df_clean.columns:
-                try:
-                    df_clean[field] = df_clean[field].astype(str).str.title().str.strip()
-                    df_clean.loc[df_clean[field].isin(['Nan', 'None', 'Null', '']), field] = ''
-                except Exception:
-                    pass
-        
-        # Handle dates
-        if 'date_of_birth' in df_clean.columns:
-            try:
-                df_clean['date_of_birth'] = pd.to_datetime(df_clean['date_of_birth'], errors='coerce')
-            except Exception:
-                pass
-        
-        return df_clean
-    except Exception as e:
-        st.error(f"Error cleaning data: {e}")
-        return df
-
-def get_client_completeness(client_data):
-    """Calculate completeness percentage for a client with error handling"""
-    try:
-        total_fields = len(CLIENT_FIELDS)
-        filled_fields = 0
-        
-        for field in CLIENT_FIELDS:
-            value = safe_str(safe_get(client_data, field, ""))
-            if value and value.lower() not in ['', 'nan', 'none', 'null']:
-                filled_fields += 1
-        
-        return (filled_fields / total_fields) * 100 if total_fields > 0 else 0
-    except Exception:
-        return 0
+    parts = [f"""
+<div class="profile-header">
+    <h1 style='margin:0; font-size:2.5em;'>{full_name}</h1>
+    <p style='margin:0.5rem 0 0 0; font-size:1.2em; opacity:0.9;'>{email}</p>
+    <p style='margin:0.5rem 0 0 0; font-size:1em; opacity:0.8;'>Profile Completeness: {completeness:.1f}%</p>
+</div>
+"""]
+    for category, fields in FIELD_CATEGORIES.items():
+        parts.append(f"""<div class="field-section">
+<h3 style='margin-top:0; color:#495057;'>{category}</h3>
+""")
+        for field in fields:
+            if field in CLIENT_FIELDS:
+                field_label = field.replace('_', ' ').title()
+                # Dates are pre-formatted once per load by the cleaner
+                source = DATE_DISPLAY_FIELD if field == 'date_of_birth' and DATE_DISPLAY_FIELD in snapshot.df.columns else field
+                field_value = format_field_value(safe_get(client_data, source), source)
+                parts.append(f"""<div class="field-row">
+    <div class="field-label">{field_label}:</div>
+    <div class="field-value">{field_value}</div>
+</div>
+""")
+        parts.append("</div>\n")
+    return "".join(parts)
+
+# ======= SEGMENT EXPORTS =======
+def build_segment_exports(snapshot, row_ids):
+    """CSV and JSON export of the given rows, without derived columns"""
+    export = snapshot.df.iloc[row_ids].drop(columns=[DATE_DISPLAY_FIELD], errors='ignore')
+    return (
+        export.to_csv(index=False),
+        export.to_json(orient='records', indent=2, date_format='iso'),
+    )
 
-def format_field_value(value, field_name):
-    """Format field values for display with error handling"""
-    try:
-        value_str = safe_str(value)
-        
-        if not value_str or value_str.lower() in ['nan', 'none', 'null']:
-            return '<span class="empty-value">Not provided</span>'
-        
-        # Special formatting for specific fields
-        if field_name == 'email' and '@' in value_str:
-            return f'<a href="mailto:{value_str}" target="_blank">{value_str}</a>'
-        elif field_name == 'phone' and len(value_str) >= 7:
-            return f'<a href="tel:{value_str}">{value_str}</a>'
-        elif field_name == 'date_of_birth':
-            try:
-                date_obj = pd.to_datetime(value_str)
-                return date_obj.strftime('%B %d, %Y')
-            except:
-                return value_str
-        elif 'address' in field_name or field_name in ['city', 'state', 'country']:
-            return value_str.title()
-        else:
-            return value_str
-    except Exception:
-        return '<span class="empty-value">Error displaying value</span>'
+@st.cache_resource
+def get_client_store():
+    """Process-wide client snapshot shared by every session"""
+    return ClientStore()
+
+@st.cache_resource
+def get_query_cache():
+    """Search/sort results shared by every session"""
+    return QueryCache()
+
+@st.cache_resource
+def get_profile_cache():
+    """Rendered profile HTML shared by every session"""
+    return LRUCache(PROFILE_CACHE_SIZE)
+
+@st.cache_resource
+def get_segment_export_cache():
+    """Segment exports shared by every session, keyed by data version and definition"""
+    return LRUCache(SEGMENT_EXPORT_CACHE_SIZE)
+
+@st.cache_resource
+def get_journal_replayer():
+    """Process-wide journal of client adds and the thread syncing it to Sheets"""
+    replayer = JournalReplayer(ClientJournal())
+    replayer.on_synced = get_client_store().invalidate
+    replayer.start()
+    return replayer
+
+client_store = get_client_store()
+segment_store = SegmentStore()
+query_cache = get_query_cache()
+profile_cache = get_profile_cache()
+segment_export_cache = get_segment_export_cache()
+journal_replayer = get_journal_replayer()
+journal_replayer.set_client(gc, service_account)
+
+if refresh_requested:
+    client_store.invalidate()
+    st.rerun()
 
 # ======= MAIN APPLICATION =======
-# Initialize session state
-if 'df' not in st.session_state:
-    st.session_state.df = pd.DataFrame(columns=CLIENT_FIELDS)
-    st.session_state.load_status = "Not loaded"
-    st.session_state.last_refresh = 0
-
-# Auto-refresh mechanism
-current_time = time.time()
-if auto_refresh and (current_time - st.session_state.last_refresh) > refresh_interval:
-    st.cache_data.clear()
-    if 'df' in st.session_state:
-        del st.session_state['df']
-
-# Load data if not in session state or if refresh needed
-if 'df' not in st.session_state or st.session_state.df.empty:
+# The local SQLite engine needs no Google credentials
+use_local_storage = BACKEND == "sqlite"
+
+# Load (or reuse) the shared snapshot; sessions never hold their own copy
+if gc or use_local_storage:
     loading_placeholder = st.empty()
-    loading_placeholder.info("🔄 Loading live client data...")
-    df, load_status = load_live_client_data()
-    st.session_state.df = df
-    st.session_state.load_status = load_status
-    st.session_state.last_refresh = current_time
+    if client_store.current is None:
+        loading_placeholder.info("🔄 Loading live client data...")
+    snapshot = client_store.get(load_live_client_data, max_age=refresh_interval)
     loading_placeholder.empty()
+    for level, text in snapshot.notices:
+        getattr(st.sidebar, level)(text)
 else:
-    df = st.session_state.df
-    load_status = st.session_state.load_status
+    snapshot = empty_snapshot("No authentication")
+
+df = snapshot.df
+load_status = snapshot.status
+
+# A new data version invalidates this session's row ids
+if st.session_state.get('data_version') != snapshot.version:
+    st.session_state.data_version = snapshot.version
+    st.session_state.filter_ids = snapshot.row_ids
 
 # Display connection status and data info
 col1, col2, col3, col4 = st.columns(4)
@@ -554,7 +363,7 @@ col2.markdown(f"""
 """, unsafe_allow_html=True)
 
 if not df.empty:
-    avg_completeness = df.apply(lambda row: get_client_completeness(row), axis=1).mean()
+    avg_completeness = snapshot.completeness.mean()
 else:
     avg_completeness = 0
 col3.markdown(f"""
@@ -603,7 +412,7 @@ if tab1:
         st.subheader("🔍 Select Client Profile")
         
         # Search and filter options
-        search_col1, search_col2 = st.columns([2, 1])
+        search_col1, segment_col, search_col2 = st.columns([2, 1, 1])
         
         search_term = search_col1.text_input(
             "🔎 Search clients:",
@@ -611,7 +420,14 @@ if tab1:
             help="Search across all client fields"
         )
         
-        available_sort_fields = [field for field in ["full_name", "email", "company_id", "first_name", "last_name"] if field in df.columns]
+        saved_segments = segment_store.load()
+        selected_segment = segment_col.selectbox(
+            "🎯 Segment:",
+            [None] + saved_segments,
+            format_func=lambda s: "All clients" if s is None else s['name']
+        )
+        
+        available_sort_fields = [field for field in SORT_FIELDS if field in df.columns]
         if available_sort_fields:
             sort_by = search_col2.selectbox(
                 "📊 Sort by:",
@@ -621,103 +437,132 @@ if tab1:
         else:
             sort_by = None
         
-        # Filter clients based on search
-        filtered_df = df.copy()
-        if search_term:
-            try:
-                mask = df.astype(str).apply(
-                    lambda x: x.str.contains(search_term, case=False, na=False)
-                ).any(axis=1)
-                filtered_df = df[mask]
-            except Exception as e:
-                st.warning(f"Search error: {e}")
+        # Filter by segment and search, then sort (cached row ids into the shared frame)
+        filtered_ids = snapshot.row_ids
+        try:
+            filtered_ids = query_cache.query(snapshot, search_term, sort_by, selected_segment)
+        except Exception as e:
+            st.warning(f"Search error: {e}")
         
-        # Sort clients
-        if sort_by and sort_by in filtered_df.columns:
-            try:
-                filtered_df = filtered_df.sort_values(sort_by)
-            except Exception as e:
-                st.warning(f"Sort error: {e}")
+        st.session_state.filter_ids = filtered_ids
         
         st.markdown('</div>', unsafe_allow_html=True)
+        
+        # ======= SAVED SEGMENTS =======
+        with st.expander("🎯 Manage Segments"):
+            st.write("**New Segment** (all conditions must match)")
+            segment_name = st.text_input("Segment name", key="segment_name")
+            conditions = []
+            for i in range(3):
+                cond_col1, cond_col2, cond_col3 = st.columns(3)
+                cond_field = cond_col1.selectbox(
+                    "Field", [''] + SEGMENT_FIELDS, key=f"segment_field_{i}",
+                    format_func=lambda x: x.replace('_', ' ').title() if x else "—"
+                )
+                cond_op = cond_col2.selectbox(
+                    "Condition", list(SEGMENT_OPS), key=f"segment_op_{i}",
+                    format_func=lambda x: SEGMENT_OPS[x]
+                )
+                cond_value = cond_col3.text_input("Value", key=f"segment_value_{i}")
+                if cond_field:
+                    conditions.append({"field": cond_field, "op": cond_op, "value": cond_value.strip()})
+            
+            if st.button("💾 Save Segment"):
+                success, message = segment_store.save({"name": segment_name.strip(), "conditions": conditions})
+                if success:
+                    st.success(f"✅ {message}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+            
+            for segment in saved_segments:
+                st.markdown("---")
+                segment_ids = segment_index(snapshot).row_ids(segment)
+                st.write(f"**{segment['name']}** — {len(segment_ids)} clients")
+                st.caption(" AND ".join(
+                    f"{c['field']} {SEGMENT_OPS.get(c['op'], c['op'])} {c.get('value', '')}".strip()
+                    for c in segment['conditions']
+                ))
+                seg_col1, seg_col2, seg_col3 = st.columns(3)
+                export_key = (snapshot.version, segment_key(segment))
+                segment_exports = segment_export_cache.get(export_key)
+                if segment_exports is None:
+                    segment_exports = segment_export_cache.put(
+                        export_key, build_segment_exports(snapshot, segment_ids)
+                    )
+                segment_csv, segment_json = segment_exports
+                segment_file = segment['name'].replace(' ', '_')
+                seg_col1.download_button(
+                    label="📄 Export CSV",
+                    data=segment_csv,
+                    file_name=f"{segment_file}_segment.csv",
+                    mime='text/csv',
+                    key=f"segment_csv_{segment['name']}"
+                )
+                seg_col2.download_button(
+                    label="🔗 Export JSON",
+                    data=segment_json,
+                    file_name=f"{segment_file}_segment.json",
+                    mime='application/json',
+                    key=f"segment_json_{segment['name']}"
+                )
+                if seg_col3.button("🗑️ Delete", key=f"segment_delete_{segment['name']}"):
+                    segment_store.delete(segment['name'])
+                    st.rerun()
 
         # ======= CLIENT LIST =======
-        if filtered_df.empty:
+        if len(filtered_ids) == 0:
             st.info("🔍 No clients found matching your search criteria.")
         else:
-            st.subheader(f"👥 Client List ({len(filtered_df)} clients)")
+            st.subheader(f"👥 Client List ({len(filtered_ids)} clients)")
             
-            # Create client selection
-            client_options = []
-            for idx, row in filtered_df.iterrows():
-                try:
-                    full_name = safe_str(safe_get(row, 'full_name', 'Unknown'))
-                    email = safe_str(safe_get(row, 'email', 'No email'))
-                    company = safe_str(safe_get(row, 'company_id', 'No company'))
-                    completeness = get_client_completeness(row)
-                    
-                    # Status indicator based on completeness
-                    if completeness >= 80:
-                        status = "🟢"
-                    elif completeness >= 50:
-                        status = "🟡"
-                    else:
-                        status = "🔴"
-                    
-                    display_text = f"{status} {full_name} ({email}) - {company} [{completeness:.0f}% complete]"
-                    client_options.append((display_text, idx))
-                except Exception as e:
-                    st.warning(f"Error processing client at index {idx}: {e}")
-                    continue
-            
-            # Client selection dropdown
+            # Client selection dropdown (labels are built once per data version)
+            labels = client_labels(snapshot)
+            client_options = filtered_ids.tolist()
             if client_options:
-                selected_option = st.selectbox(
+                selected_idx = st.selectbox(
                     "Select a client to view their profile:",
                     client_options,
-                    format_func=lambda x: x[0]
+                    format_func=lambda idx: labels[idx]
                 )
                 
-                if selected_option:
-                    selected_display, selected_idx = selected_option
+                if selected_idx is not None:
                     
                     # ======= INDIVIDUAL CLIENT PROFILE =======
-                    if selected_idx is not None and selected_idx in filtered_df.index:
-                        client_data = filtered_df.loc[selected_idx]
-                        
-                        # Profile header
+                    if selected_idx is not None and 0 <= selected_idx < len(df):
+                        client_data = df.iloc[selected_idx]
                         full_name = safe_str(safe_get(client_data, 'full_name', 'Unknown Client'))
-                        email = safe_str(safe_get(client_data, 'email', 'No email provided'))
-                        completeness = get_client_completeness(client_data)
                         
-                        st.markdown(f"""
-                        <div class="profile-header">
-                            <h1 style='margin:0; font-size:2.5em;'>{full_name}</h1>
-                            <p style='margin:0.5rem 0 0 0; font-size:1.2em; opacity:0.9;'>{email}</p>
-                            <p style='margin:0.5rem 0 0 0; font-size:1em; opacity:0.8;'>Profile Completeness: {completeness:.1f}%</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        # One pre-built HTML block per (data version, client)
+                        profile_key = (snapshot.version, selected_idx)
+                        profile_html = profile_cache.get(profile_key)
+                        if profile_html is None:
+                            profile_html = profile_cache.put(profile_key, build_profile_html(snapshot, selected_idx))
+                        st.markdown(profile_html, unsafe_allow_html=True)
                         
-                        # Display fields by category
-                        for category, fields in FIELD_CATEGORIES.items():
-                            st.markdown(f"""
-                            <div class="field-section">
-                                <h3 style='margin-top:0; color:#495057;'>{category}</h3>
-                            """, unsafe_allow_html=True)
-                            
-                            # Create field rows
-                            for field in fields:
-                                if field in CLIENT_FIELDS:
-                                    field_label = field.replace('_', ' ').title()
-                                    field_value = format_field_value(safe_get(client_data, field), field)
-                                    st.markdown(f"""
-                                    <div class="field-row">
-                                        <div class="field-label">{field_label}:</div>
-                                        <div class="field-value">{field_value}</div>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)
+                        # ======= SIMILAR CLIENTS =======
+                        st.markdown("---")
+                        st.subheader("🧬 Similar Clients")
+                        try:
+                            similar_ids, similar_scores = similar_clients(profile_matrix(snapshot), selected_idx, k=5)
+                        except Exception as e:
+                            similar_ids, similar_scores = [], []
+                            st.warning(f"Similarity error: {e}")
+                        
+                        if len(similar_ids) == 0:
+                            st.info("Not enough DISC or behaviour data to find similar clients.")
+                        else:
+                            st.dataframe(
+                                pd.DataFrame({
+                                    "Client": df['full_name'].to_numpy()[similar_ids],
+                                    "Email": df['email'].to_numpy()[similar_ids],
+                                    "Company": df['company_id'].to_numpy()[similar_ids],
+                                    "DISC Profile": df['discprofile'].to_numpy()[similar_ids],
+                                    "Similarity": [f"{score * 100:.0f}%" for score in similar_scores],
+                                }),
+                                hide_index=True,
+                                use_container_width=True
+                            )
                         
                         # ======= PROFILE ACTIONS =======
                         st.markdown("---")
@@ -749,7 +594,7 @@ if tab1:
                         st.subheader("📥 Export Client Data")
                         
                         # Prepare client data for export
-                        client_export_data = pd.DataFrame([client_data])
+                        client_export_data = pd.DataFrame([client_data]).drop(columns=[DATE_DISPLAY_FIELD], errors='ignore')
                         
                         export_col1, export_col2 = st.columns(2)
                         
@@ -784,7 +629,7 @@ if tab2:
     </div>
     """, unsafe_allow_html=True)
     
-    if not gc:
+    if not gc and not use_local_storage:
         st.error("❌ Please authenticate with Google Sheets first (upload JSON file in sidebar)")
     else:
         # Create form without context manager
@@ -887,66 +732,50 @@ if tab2:
         
         if submitted:
             # Validate required fields
-            errors = []
-            
-            # Check for required fields
-            if not form_data.get('first_name', '').strip():
-                errors.append("First name is required")
-            if not form_data.get('last_name', '').strip():
-                errors.append("Last name is required")
-            if not form_data.get('email', '').strip():
-                errors.append("Email is required")
-            
-            # Validate email format
-            if form_data.get('email', '').strip() and not validate_email(form_data['email']):
-                errors.append("Please enter a valid email address")
-            
-            # Validate phone if provided
-            if form_data.get('phone', '').strip() and not validate_phone(form_data['phone']):
-                errors.append("Please enter a valid phone number")
+            errors = validate_client(form_data)
             
             if errors:
                 st.error("❌ Please fix the following errors:")
                 for error in errors:
                     st.error(f"• {error}")
             else:
-                # Auto-generate full name if not provided
-                if not form_data.get('full_name', '').strip():
-                    first_name = form_data.get('first_name', '').strip()
-                    last_name = form_data.get('last_name', '').strip()
-                    form_data['full_name'] = f"{first_name} {last_name}".strip()
+                # Clean and prepare data (auto-generates full name if not provided)
+                clean_data = prepare_client_record(form_data)
                 
-                # Clean and prepare data
-                clean_data = {}
-                for field in CLIENT_FIELDS:
-                    value = form_data.get(field, '')
-                    if isinstance(value, str):
-                        value = value.strip()
-                    clean_data[field] = value
+                saved, message = True, "Client saved! Syncing to Google Sheets in the background."
+                if use_local_storage:
+                    # Local engine: the write is fast, so apply it directly
+                    saved, message = get_storage_backend().append_batch([clean_data])
+                    if saved:
+                        # Publish the new row incrementally instead of reloading everything
+                        client_store.append_clients([clean_data])
+                    else:
+                        st.error(f"❌ {message}")
                 
-                # Add to Google Sheet
-                loading_placeholder = st.empty()
-                loading_placeholder.info("Adding client to Google Sheets...")
-                success, message = append_client_to_sheet(gc, clean_data)
-                loading_placeholder.empty()
+                if saved:
+                    # Write to the local journal; the replayer pushes it to Google Sheets
+                    try:
+                        journal_replayer.journal.record(clean_data)
+                        journal_replayer.wake()
+                    except Exception as e:
+                        if use_local_storage:
+                            # The row is already in the local store; retrying would duplicate it
+                            message = "Client saved locally, but Google Sheets sync failed"
+                            st.warning(f"⚠️ Could not queue the Google Sheets sync: {str(e)}")
+                        else:
+                            saved = False
+                            st.error(f"❌ Error saving client: {str(e)}")
                 
-                if success:
+                if saved:
                     st.success(f"✅ {message}")
                     st.balloons()
                     
-                    # Clear cache to refresh data
-                    st.cache_data.clear()
-                    if 'df' in st.session_state:
-                        del st.session_state['df']
-                    
                     # Show success message with client info
                     st.info(f"🎉 Successfully added {clean_data['full_name']} to your CRM!")
                     
                     # Option to add another client
                     if st.button("➕ Add Another Client"):
                         st.rerun()
-                else:
-                    st.error(f"❌ {message}")
 
 # ======= TAB 3: DEBUG INFO =======
 if tab3:
@@ -956,14 +785,34 @@ if tab3:
     
     col1.write("**Connection Status:**")
     col1.write(f"• Authentication: {'✅ Connected' if gc else '❌ Not Connected'}")
+    col1.write(f"• Storage Backend: {BACKEND}")
     col1.write(f"• Load Status: {load_status}")
     col1.write(f"• Auto Refresh: {'✅ Enabled' if auto_refresh else '❌ Disabled'}")
     col1.write(f"• Refresh Interval: {refresh_interval}s")
     
+    journal_stats = journal_replayer.journal.stats()
+    col1.write("**Sync Journal:**")
+    col1.write(f"• Pending Adds: {journal_stats['pending']}")
+    col1.write(f"• Synced Adds: {journal_stats['synced']}")
+    if journal_stats['last_error']:
+        col1.write(f"• Last Sync Error: {journal_stats['last_error']}")
+    
+    query_stats = query_cache.stats()
+    col1.write("**Query Cache:**")
+    col1.write(f"• Cached Results: {query_stats['entries']}")
+    col1.write(f"• Hits / Misses: {query_stats['hits']} / {query_stats['misses']}")
+    col1.write(f"• Cached Profiles: {len(profile_cache)} ({profile_cache.hits} hits)")
+    col1.write(f"• Cached Segment Exports: {len(segment_export_cache)} ({segment_export_cache.hits} hits)")
+    
     col1.write("**Data Information:**")
     col1.write(f"• DataFrame Shape: {df.shape if not df.empty else 'Empty'}")
     col1.write(f"• Total Clients: {len(df)}")
-    col1.write(f"• Last Refresh: {datetime.datetime.fromtimestamp(st.session_state.last_refresh).strftime('%H:%M:%S') if st.session_state.last_refresh > 0 else 'Never'}")
+    col1.write(f"• Last Refresh: {datetime.datetime.fromtimestamp(snapshot.loaded_at).strftime('%H:%M:%S') if snapshot.loaded_at > 0 else 'Never'}")
+    col1.write(f"• Data Version: {snapshot.version}")
+    
+    col1.write("**Memory:**")
+    col1.write(f"• Shared Snapshot: {snapshot.memory_bytes / 1024 / 1024:.2f} MB")
+    col1.write(f"• This Session: {session_memory_bytes(st.session_state) / 1024:.1f} KB")
     
     col2.write("**Expected Fields:**")
     for field in CLIENT_FIELDS[:15]:  # Show first 15 fields
@@ -971,6 +820,10 @@ if tab3:
     if len(CLIENT_FIELDS) > 15:
         col2.write(f"... and {len(CLIENT_FIELDS) - 15} more fields")
     
+    if snapshot.shard_report:
+        st.write("**Shards:**")
+        st.dataframe(pd.DataFrame(snapshot.shard_report))
+    
     if not df.empty:
         st.write("**Sample Data:**")
         st.dataframe(df.head(3))
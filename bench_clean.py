@@ -0,0 +1,66 @@
+"""Benchmark serial vs. process-pool cleaning on a synthetic client frame.
+
+    python bench_clean.py --rows 500000 --workers 16
+"""
+import argparse
+import os
+import random
+import time
+
+import pandas as pd
+
+from crm_data import CLIENT_FIELDS, clean_client_data
+from crm_parallel import clean_client_data_parallel
+
+FIRST_NAMES = ["alice", "BOB", " carol ", "dave", "Eve", "frank", "nan", ""]
+LAST_NAMES = ["smith", "JONES", "o'brien ", "garcia", "None", "lee"]
+EMAILS = ["{}@example.com", " {}@Example.ORG ", "not-an-email", "", "{}@mail.co"]
+PHONES = ["+1-555-123-4567", "12345", "", "(555) 987 6543"]
+DATES = ["1990-01-02", "1985-12-31", "", "2001-07-04", "not a date"]
+
+
+def make_frame(n_rows, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        row = {field: f"{field} {i % 97}" for field in CLIENT_FIELDS}
+        row.update(
+            first_name=first,
+            last_name=last,
+            full_name=f"{first} {last}",
+            email=rng.choice(EMAILS).format(f"user{i}"),
+            phone=rng.choice(PHONES),
+            date_of_birth=rng.choice(DATES),
+        )
+        rows.append(row)
+    return pd.DataFrame(rows, columns=CLIENT_FIELDS)
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    df = make_frame(args.rows)
+    serial, serial_s = timed(clean_client_data, df)
+    # Force the pool so it is measured even below the production gates
+    parallel, parallel_s = timed(
+        clean_client_data_parallel, df, workers=args.workers, min_rows=0, min_cpus=1
+    )
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    print(f"rows={args.rows} workers={args.workers} cpus={os.cpu_count()}")
+    print(f"serial:   {serial_s:.2f}s")
+    print(f"parallel: {parallel_s:.2f}s  ({serial_s / parallel_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+"""Data layer for the Live CRM: sheet loading, cleaning, validation and export.
+
+Nothing in here imports Streamlit, so the same code path can be driven from
+the web app (app.py) or from headless jobs (crm_sync.py).  gspread and the
+Google auth libraries are imported lazily so importing this module stays cheap.
+"""
+import datetime
+import functools
+import logging
+import os
+import re
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ======= CONFIGURATION =======
+SHEET_ID = "188i0tHyaEH_0hkSXfdMXoP1c3quEp54EAyuqmMUgHN0"
+SHEET_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# Worksheet names tried in order before falling back to the first worksheet
+WORKSHEET_NAMES = ["Clients", "Client Data", "Sheet1", "Main", "Data"]
+
+# All client fields as specified
+CLIENT_FIELDS = [
+    "first_name", "last_name", "full_name", "email", "timezone", "address_line_1",
+    "address_line_2", "city", "state", "postal_code", "country", "ip", "phone",
+    "source", "date_of_birth", "company_id", "discprofile", "discsales",
+    "disc_communiction", "leadership_style", "team_dynamics", "conflict_resolution",
+    "customer_service_approach", "decision_making_style", "workplace_behavior",
+    "hiring_and_recruitment", "_coaching_and_development"
+]
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+EMPTY_MARKERS = ['', 'nan', 'none', 'null']
+
+# Formats tried, in order, for dates that don't match the column's detected format
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y",
+]
+# Numeric day/month formats; a column uses one order or the other, never both
+MONTH_FIRST_FORMATS = ["%m/%d/%Y", "%m.%d.%Y", "%m-%d-%Y"]
+DAY_FIRST_FORMATS = ["%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y"]
+# Values such as 03/04/2001 whose reading depends on that order
+NUMERIC_DATE_PATTERN = r"^(\d{1,2})[/.-](\d{1,2})[/.-]\d{2,4}$"
+DATE_DISPLAY_FORMAT = '%B %d, %Y'
+# Column added by clean_client_data with the pre-formatted date_of_birth
+DATE_DISPLAY_FIELD = "date_of_birth_display"
+
+# ======= UTILITY FUNCTIONS =======
+def safe_get(obj, key, default=""):
+    """Safely get a value from object with default"""
+    try:
+        if isinstance(obj, dict):
+            return obj.get(key, default)
+        elif hasattr(obj, key):
+            return getattr(obj, key, default)
+        else:
+            return default
+    except Exception:
+        return default
+
+def safe_str(value, default=""):
+    """Safely convert value to string"""
+    try:
+        if pd.isna(value):
+            return default
+        return str(value).strip()
+    except Exception:
+        return default
+
+def safe_len(obj):
+    """Safely get length of object"""
+    try:
+        return len(obj) if obj is not None else 0
+    except Exception:
+        return 0
+
+# ======= VALIDATION =======
+def validate_email(email):
+    """Validate email format"""
+    if not email:
+        return False
+    return re.match(EMAIL_PATTERN, email) is not None
+
+def validate_phone(phone):
+    """Validate phone number"""
+    if not phone:
+        return False
+    # Remove all non-digit characters
+    digits_only = re.sub(r'\D', '', phone)
+    return len(digits_only) >= 7
+
+def validate_client(form_data):
+    """Return a list of validation errors for a new client record"""
+    errors = []
+
+    # Check for required fields
+    if not form_data.get('first_name', '').strip():
+        errors.append("First name is required")
+    if not form_data.get('last_name', '').strip():
+        errors.append("Last name is required")
+    if not form_data.get('email', '').strip():
+        errors.append("Email is required")
+
+    # Validate email format
+    if form_data.get('email', '').strip() and not validate_email(form_data['email']):
+        errors.append("Please enter a valid email address")
+
+    # Validate phone if provided
+    if form_data.get('phone', '').strip() and not validate_phone(form_data['phone']):
+        errors.append("Please enter a valid phone number")
+
+    return errors
+
+def prepare_client_record(form_data):
+    """Strip values, fill in full_name and restrict a form to CLIENT_FIELDS"""
+    form_data = dict(form_data)
+
+    # Auto-generate full name if not provided
+    if not form_data.get('full_name', '').strip():
+        first_name = form_data.get('first_name', '').strip()
+        last_name = form_data.get('last_name', '').strip()
+        form_data['full_name'] = f"{first_name} {last_name}".strip()
+
+    clean_data = {}
+    for field in CLIENT_FIELDS:
+        value = form_data.get(field, '')
+        if isinstance(value, str):
+            value = value.strip()
+        clean_data[field] = value
+    return clean_data
+
+# ======= GOOGLE SHEETS ACCESS =======
+def authorize(creds_dict):
+    """Build an authorized gspread client from service account info"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+def open_client_worksheet(gc, notices=None, sheet_id=SHEET_ID, worksheet_name=None):
+    """Open the spreadsheet and pick the worksheet holding client data.
+
+    With ``worksheet_name`` only that worksheet is used; otherwise the
+    WORKSHEET_NAMES are tried before falling back to the first worksheet.
+    Informational messages are appended to ``notices`` as ``(level, text)``
+    pairs so callers decide how to surface them.
+    """
+    import gspread
+
+    if notices is None:
+        notices = []
+
+    sh = gc.open_by_key(sheet_id)
+
+    if worksheet_name:
+        try:
+            return sh.worksheet(worksheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            notices.append(("warning", f"Worksheet not found: {worksheet_name}"))
+            return None
+
+    # Get all available worksheets
+    try:
+        all_worksheets = sh.worksheets()
+        available_names = [ws.title for ws in all_worksheets]
+        notices.append(("info", f"Available sheets: {', '.join(available_names)}"))
+    except Exception:
+        all_worksheets = []
+
+    # Try to find the right worksheet
+    for name in WORKSHEET_NAMES:
+        try:
+            worksheet = sh.worksheet(name)
+            notices.append(("success", f"Using sheet: {name}"))
+            return worksheet
+        except gspread.exceptions.WorksheetNotFound:
+            continue
+
+    if all_worksheets:
+        # Use the first available worksheet
+        worksheet = all_worksheets[0]
+        notices.append(("warning", f"Using first available sheet: {worksheet.title}"))
+        return worksheet
+
+    return None
+
+def column_letter(index):
+    """A1-notation column letters for a zero-based column index (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def fetch_client_rows(gc, notices=None, sheet_id=SHEET_ID, worksheet_name=None):
+    """Read one worksheet into an uncleaned frame restricted to CLIENT_FIELDS.
+
+    Only the header row and the columns named in CLIENT_FIELDS are downloaded
+    (one ``batch_get`` of column ranges), so extra sheet columns cost nothing.
+    Returns ``(df, status)``; ``status`` is "Success" or an error message.
+    """
+    if notices is None:
+        notices = []
+
+    if not gc:
+        return pd.DataFrame(columns=CLIENT_FIELDS), "No authentication"
+
+    try:
+        worksheet = open_client_worksheet(gc, notices, sheet_id, worksheet_name)
+
+        if not worksheet:
+            return pd.DataFrame(columns=CLIENT_FIELDS), "No worksheets found"
+
+        # Read the header row once
+        try:
+            headers = worksheet.row_values(1)
+        except Exception as e:
+            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error reading data: {e}"
+
+        if not headers:
+            return pd.DataFrame(columns=CLIENT_FIELDS), "Sheet is empty"
+
+        notices.append(("info", f"Available columns: {', '.join(headers[:10])}{'...' if len(headers) > 10 else ''}"))
+
+        # Map each needed field to its column; the first occurrence wins
+        field_columns = {}
+        for position, header in enumerate(headers):
+            if header in CLIENT_FIELDS and header not in field_columns:
+                field_columns[header] = column_letter(position)
+
+        missing_columns = [col for col in CLIENT_FIELDS if col not in field_columns]
+        if missing_columns:
+            notices.append(("warning", f"Missing columns (added as empty): {', '.join(missing_columns[:5])}{'...' if len(missing_columns) > 5 else ''}"))
+
+        # Fetch only the needed columns, below the header, in one request
+        fields = list(field_columns)
+        try:
+            ranges = [f"{field_columns[field]}2:{field_columns[field]}" for field in fields]
+            value_ranges = worksheet.batch_get(ranges, major_dimension='COLUMNS') if ranges else []
+        except Exception as e:
+            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error reading data: {e}"
+
+        # The API trims trailing empty cells, so pad every column to the longest one
+        columns = {field: list(values[0]) if values else [] for field, values in zip(fields, value_ranges)}
+        n_rows = max((len(values) for values in columns.values()), default=0)
+
+        if n_rows == 0:
+            return pd.DataFrame(columns=CLIENT_FIELDS), "No data rows found (only headers or empty)"
+
+        # Create DataFrame
+        try:
+            data = {}
+            for field in CLIENT_FIELDS:
+                values = columns.get(field, [])
+                data[field] = values + [""] * (n_rows - len(values))
+            df = pd.DataFrame(data, columns=CLIENT_FIELDS)
+        except Exception as e:
+            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error creating DataFrame: {e}"
+
+        return df, "Success"
+
+    except Exception as e:
+        error_msg = f"Error loading data: {str(e)[:200]}"
+        return pd.DataFrame(columns=CLIENT_FIELDS), error_msg
+
+def finish_client_frame(df, workers=None):
+    """Clean a raw client frame and drop completely empty rows
+
+    Passing ``workers`` > 1 cleans large frames in a process pool
+    (see crm_parallel.clean_client_data_parallel).
+    """
+    if workers and workers > 1:
+        from crm_parallel import clean_client_data_parallel
+        df = clean_client_data_parallel(df, workers=workers)
+    else:
+        df = clean_client_data(df)
+
+    # Remove completely empty rows
+    return df.dropna(how='all')
+
+def build_sheet_row(headers, client_data):
+    """Lay out ``client_data`` as a sheet row matching ``headers``"""
+    row_data = []
+    for field in headers:
+        if field in client_data:
+            value = client_data[field]
+            if isinstance(value, datetime.date):
+                value = value.strftime('%Y-%m-%d')
+            row_data.append(str(value) if value else "")
+        else:
+            row_data.append("")
+    return row_data
+
+# ======= CLEANING =======
+# Columns clean_client_data rewrites or adds; every other column is copied as is
+CLEANED_FIELDS = [
+    "email", "phone", "first_name", "last_name", "full_name", "date_of_birth",
+    DATE_DISPLAY_FIELD,
+]
+
+def clean_client_data(df, date_format=None):
+    """Clean and format client data with error handling
+
+    ``date_format`` is the format tried first for ``date_of_birth`` (see
+    normalize_dates); by default it is detected from ``df``.
+    """
+    if df.empty:
+        return df
+
+    try:
+        df_clean = df.copy()
+
+        # Clean email addresses
+        if 'email' in df_clean.columns:
+            try:
+                df_clean['email'] = df_clean['email'].astype(str).str.lower().str.strip()
+                # Remove invalid emails
+                df_clean.loc[~df_clean['email'].str.match(EMAIL_PATTERN, na=False), 'email'] = ''
+            except Exception:
+                pass
+
+        # Clean phone numbers
+        if 'phone' in df_clean.columns:
+            try:
+                df_clean['phone'] = df_clean['phone'].astype(str).str.strip()
+                # Remove non-phone entries
+                df_clean.loc[df_clean['phone'].str.len() < 7, 'phone'] = ''
+            except Exception:
+                pass
+
+        # Format names
+        name_fields = ['first_name', 'last_name', 'full_name']
+        for field in name_fields:
+            if field in df_clean.columns:
+                try:
+                    df_clean[field] = df_clean[field].astype(str).str.title().str.strip()
+                    df_clean.loc[df_clean[field].isin(['Nan', 'None', 'Null', '']), field] = ''
+                except Exception:
+                    pass
+
+        # Handle dates
+        if 'date_of_birth' in df_clean.columns:
+            try:
+                df_clean['date_of_birth'], df_clean[DATE_DISPLAY_FIELD] = normalize_dates(
+                    df_clean['date_of_birth'], date_format
+                )
+            except Exception:
+                pass
+
+        return df_clean
+    except Exception as e:
+        logger.error("Error cleaning data: %s", e)
+        return df
+
+def infer_date_format(values):
+    """Return the format pandas guesses from the first non-empty date in ``values``.
+
+    The day/month order of that guess is checked against the column's other
+    numeric dates: a day above 12 with no month above 12 means day-first,
+    and vice versa.  When the guess carries no order (ISO, month names) or
+    none can be made (``"mixed"``, also the only answer on pandas < 2.2,
+    which has no public ``guess_datetime_format``), a day-first column gets
+    ``"%d/%m/%Y"`` so the order is still kept; see normalize_dates.
+    """
+    text = pd.Series(pd.unique(np.asarray(values, dtype=object))).dropna().astype(str).str.strip()
+    text = text[~text.str.lower().isin(EMPTY_MARKERS + ['nat'])]
+    if text.empty:
+        return "mixed"
+    fmt = None
+    try:
+        from pandas.tseries.api import guess_datetime_format
+    except ImportError:
+        pass
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            fmt = guess_datetime_format(text.iloc[0])
+
+    parts = text.str.extract(NUMERIC_DATE_PATTERN).dropna().astype(int)
+    day_over_12, month_over_12 = (parts[0] > 12).any(), (parts[1] > 12).any()
+    day_first = day_over_12 and not month_over_12
+    month_first = month_over_12 and not day_over_12
+
+    if fmt and "%d" in fmt and "%m" in fmt and not fmt.startswith("%Y"):
+        if (day_first and not is_day_first(fmt)) or (month_first and is_day_first(fmt)):
+            fmt = fmt.replace("%d", "\0").replace("%m", "%d").replace("\0", "%m")
+        return fmt
+    if day_first:
+        # The guess (ISO, month names) does not carry an order; record day-first
+        return "%d/%m/%Y"
+    return fmt or "mixed"
+
+def is_day_first(date_format):
+    """Whether ``date_format`` reads numeric dates day before month (default: month first)"""
+    if not date_format or date_format.startswith("%Y"):
+        return False
+    day, month = date_format.find("%d"), date_format.find("%m")
+    return 0 <= day < month
+
+def normalize_dates(values, date_format=None):
+    """Parse a date column into ``(dates, display)`` Series.
+
+    Each distinct value is parsed once.  Values are tried against
+    ``date_format`` (detected from ``values`` when not given), then each of
+    DATE_FORMATS and the numeric formats of one day/month order, chosen from
+    ``date_format`` (is_day_first), all vectorized.  Only what is still left
+    goes through pandas' per-element parser, except numeric dates, which
+    would otherwise be read in the other order when they do not fit this
+    one.  Unparseable values become NaT with an empty display string.
+    """
+    values = pd.Series(values)
+    codes, distinct = pd.factorize(values.fillna('').astype(str).str.strip())
+    distinct = pd.Series(distinct, dtype=object)
+    if date_format is None:
+        date_format = infer_date_format(distinct.to_numpy())
+    day_first = is_day_first(date_format)
+
+    parsed = pd.Series(pd.NaT, index=distinct.index, dtype="datetime64[ns]")
+    pending = ~distinct.str.lower().isin(EMPTY_MARKERS + ['nat'])
+    formats = [date_format] if date_format and date_format != "mixed" else []
+    formats += DATE_FORMATS + (DAY_FIRST_FORMATS if day_first else MONTH_FIRST_FORMATS)
+    for fmt in dict.fromkeys(formats):
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(distinct[pending], format=fmt, errors='coerce')
+        matched = attempt.index[attempt.notna()]
+        parsed[matched] = attempt[matched]
+        pending[matched] = False
+
+    pending &= ~distinct.str.match(NUMERIC_DATE_PATTERN)
+    if pending.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            attempt = pd.to_datetime(
+                distinct[pending], format='mixed', dayfirst=day_first, errors='coerce'
+            )
+        parsed[pending] = attempt
+
+    display = parsed.dt.strftime(DATE_DISPLAY_FORMAT).fillna("")
+    dates = pd.Series(parsed.to_numpy()[codes], index=values.index, name=values.name)
+    display = pd.Series(display.to_numpy(dtype=object)[codes], index=values.index, name=DATE_DISPLAY_FIELD)
+    return dates, display
+
+def row_fingerprints(df):
+    """Stable 64-bit content hash of every row of ``df`` over CLIENT_FIELDS.
+
+    The hash only depends on the cell values, so it is the same across
+    processes and restarts and can be compared between two loads.
+    """
+    return pd.util.hash_pandas_object(
+        df.reindex(columns=CLIENT_FIELDS), index=False
+    ).to_numpy()
+
+def get_client_completeness(client_data):
+    """Calculate completeness percentage for a client with error handling"""
+    try:
+        total_fields = len(CLIENT_FIELDS)
+        filled_fields = 0
+
+        for field in CLIENT_FIELDS:
+            value = safe_str(safe_get(client_data, field, ""))
+            if value and value.lower() not in EMPTY_MARKERS:
+                filled_fields += 1
+
+        return (filled_fields / total_fields) * 100 if total_fields > 0 else 0
+    except Exception:
+        return 0
+
+def completeness_scores(df):
+    """Vectorized get_client_completeness over every row of ``df``"""
+    filled = np.zeros(len(df))
+    for field in CLIENT_FIELDS:
+        if field not in df.columns:
+            continue
+        column = df[field]
+        text = column.astype(str).str.strip().str.lower()
+        filled += (column.notna() & ~text.isin(EMPTY_MARKERS)).to_numpy()
+    return filled / len(CLIENT_FIELDS) * 100
+
+@functools.lru_cache(maxsize=4096)
+def _display_date(value_str):
+    display = normalize_dates([value_str])[1].iloc[0]
+    return display or value_str
+
+def format_field_value(value, field_name):
+    """Format field values for display with error handling"""
+    try:
+        value_str = safe_str(value)
+
+        if not value_str or value_str.lower() in ['nan', 'none', 'null']:
+            return '<span class="empty-value">Not provided</span>'
+
+        # Special formatting for specific fields
+        if field_name == 'email' and '@' in value_str:
+            return f'<a href="mailto:{value_str}" target="_blank">{value_str}</a>'
+        elif field_name == 'phone' and len(value_str) >= 7:
+            return f'<a href="tel:{value_str}">{value_str}</a>'
+        elif field_name == 'date_of_birth':
+            if hasattr(value, 'strftime'):
+                return value.strftime(DATE_DISPLAY_FORMAT)
+            return _display_date(value_str)
+        elif 'address' in field_name or field_name in ['city', 'state', 'country']:
+            return value_str.title()
+        else:
+            return value_str
+    except Exception:
+        return '<span class="empty-value">Error displaying value</span>'
+
+# ======= EXPORT =======
+EXPORT_FORMATS = ["csv", "json", "xlsx", "snapshot"]
+
+def export_format_for(path):
+    """Infer the export format from a file extension"""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in ("pkl", "pickle"):
+        return "snapshot"
+    return ext if ext in EXPORT_FORMATS else "csv"
+
+def export_clients(df, path, fmt=None):
+    """Write the client frame to ``path`` atomically.
+
+    The file is written to a temporary sibling and renamed into place so a
+    reader (or a concurrent cron run) never sees a half-written export.
+    """
+    fmt = fmt or export_format_for(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    df = df.drop(columns=[DATE_DISPLAY_FIELD], errors='ignore')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        if fmt == "csv":
+            df.to_csv(tmp_path, index=False)
+        elif fmt == "json":
+            df.to_json(tmp_path, orient='records', indent=2, date_format='iso')
+        elif fmt == "xlsx":
+            df.to_excel(tmp_path, index=False)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def load_snapshot(path):
+    """Read a client frame previously written with ``export_clients(..., 'snapshot')``"""
+    return pd.read_pickle(path)
@@ -0,0 +1,274 @@
+"""Durable local write-ahead journal for new clients.
+
+New clients are written to a local SQLite journal first and acknowledged as
+soon as that commit is on disk, so a slow or failing Sheets API never loses
+what the operator typed and never blocks the form.  A background
+``JournalReplayer`` then pushes pending entries to the sheet in order.
+
+Each entry carries a client-generated ``client_id`` that is also written to a
+``client_id`` column in the sheet.  Before appending, the replayer checks that
+column, so an entry that reached the sheet but was not marked synced (crash,
+timeout after success) is never appended twice.  Pending entries survive
+restarts because they live in the journal file.
+
+Entries are pushed in batches grouped by shard, so API calls scale with
+shards rather than entries.  The first push to a shard resolves its worksheet
+with ``open_client_worksheet`` (``open_by_key``, ``worksheets()`` and one
+``worksheet(name)`` per WORKSHEET_NAMES entry tried, so 3-7 metadata reads;
+2 when the shard names its worksheet).  The worksheet is then kept, and each
+later batch to that shard costs 3 calls: one header read, one ``client_id``
+column read and one ``append_rows``.  This keeps replay within the Sheets
+read quota that the journal exists to ride out.
+"""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from crm_data import CLIENT_FIELDS, open_client_worksheet, build_sheet_row
+from crm_shards import shard_for
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.environ.get("CRM_JOURNAL_PATH", "crm_journal.sqlite3")
+CLIENT_ID_FIELD = "client_id"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS client_adds (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    synced_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS client_adds_pending ON client_adds (synced_at, seq);
+"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+class ClientJournal:
+    """Append-only SQLite journal of client adds"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # fsync on every commit: an acknowledged add must survive a crash
+            conn.execute("PRAGMA synchronous=FULL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, client_data):
+        """Durably store a new client and return its generated client_id"""
+        client_id = uuid.uuid4().hex
+        payload = json.dumps(client_data, default=_json_default)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO client_adds (client_id, payload, created_at) VALUES (?, ?, ?)",
+                (client_id, payload, time.time()),
+            )
+        return client_id
+
+    def pending(self, limit=100):
+        """Oldest unsynced entries as ``(client_id, client_data)`` pairs"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT client_id, payload FROM client_adds "
+                "WHERE synced_at IS NULL ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [(client_id, json.loads(payload)) for client_id, payload in rows]
+
+    def mark_synced(self, client_ids):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE client_adds SET synced_at = ?, attempts = attempts + 1, last_error = NULL "
+                "WHERE client_id = ?",
+                [(now, client_id) for client_id in client_ids],
+            )
+
+    def mark_failed(self, client_ids, error):
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE client_adds SET attempts = attempts + 1, last_error = ? WHERE client_id = ?",
+                [(str(error)[:500], client_id) for client_id in client_ids],
+            )
+
+    def stats(self):
+        """Counts of pending/synced entries and the most recent error"""
+        with self._connect() as conn:
+            pending, synced = conn.execute(
+                "SELECT SUM(synced_at IS NULL), SUM(synced_at IS NOT NULL) FROM client_adds"
+            ).fetchone()
+            last_error = conn.execute(
+                "SELECT last_error FROM client_adds WHERE synced_at IS NULL AND last_error IS NOT NULL "
+                "ORDER BY seq LIMIT 1"
+            ).fetchone()
+        return {
+            "pending": pending or 0,
+            "synced": synced or 0,
+            "last_error": last_error[0] if last_error else None,
+        }
+
+
+def push_journaled_clients(gc, shard, entries, worksheets=None):
+    """Append journaled ``(client_id, client_data)`` entries to one shard.
+
+    Entries whose client_id is already in the sheet are skipped.
+    ``worksheets`` caches the shard's opened worksheet between calls.  Returns
+    ``(success, message)``.
+    """
+    if worksheets is None:
+        worksheets = {}
+    try:
+        worksheet = worksheets.get(shard)
+        if worksheet is None:
+            worksheet = open_client_worksheet(gc, sheet_id=shard.sheet_id, worksheet_name=shard.worksheet)
+            if not worksheet:
+                return False, "No worksheets found"
+            worksheets[shard] = worksheet
+
+        # Get current headers, making sure the sheet has a client_id column
+        try:
+            headers = worksheet.row_values(1)
+        except Exception:
+            headers = []
+        rows = []
+        existing = set()
+        if not headers:
+            headers = CLIENT_FIELDS + [CLIENT_ID_FIELD]
+            rows.append(headers)
+        else:
+            if CLIENT_ID_FIELD not in headers:
+                if worksheet.col_count <= len(headers):
+                    worksheet.add_cols(1)
+                worksheet.update_cell(1, len(headers) + 1, CLIENT_ID_FIELD)
+                headers = headers + [CLIENT_ID_FIELD]
+            else:
+                existing = set(worksheet.col_values(headers.index(CLIENT_ID_FIELD) + 1))
+
+        rows.extend(
+            build_sheet_row(headers, dict(client_data, **{CLIENT_ID_FIELD: client_id}))
+            for client_id, client_data in entries
+            if client_id not in existing
+        )
+        if rows:
+            worksheet.append_rows(rows)
+        return True, f"Added {len(rows)} clients"
+
+    except Exception as e:
+        # The worksheet may have been renamed or deleted; resolve it again next time
+        worksheets.pop(shard, None)
+        return False, f"Error adding clients: {str(e)}"
+
+
+def replay_journal(gc, journal, shards=None, limit=100, worksheets=None):
+    """Push pending entries, oldest first, until drained or a shard fails.
+
+    ``worksheets`` (shard -> worksheet) lets a long-running caller keep opened
+    worksheets across replays.  Returns ``(pushed, error)`` where ``error`` is
+    None if nothing failed.
+    """
+    if worksheets is None:
+        worksheets = {}
+    pushed = 0
+    while True:
+        batch = journal.pending(limit)
+        if not batch:
+            return pushed, None
+
+        by_shard = {}
+        for client_id, client_data in batch:
+            by_shard.setdefault(shard_for(client_data, shards), []).append((client_id, client_data))
+
+        error = None
+        for shard, entries in by_shard.items():
+            client_ids = [client_id for client_id, _ in entries]
+            success, message = push_journaled_clients(gc, shard, entries, worksheets)
+            if success:
+                journal.mark_synced(client_ids)
+                pushed += len(client_ids)
+            else:
+                journal.mark_failed(client_ids, message)
+                error = message
+        if error:
+            return pushed, error
+
+
+class JournalReplayer(threading.Thread):
+    """Background thread that drains the journal into the sheet.
+
+    Idle polls every ``interval`` seconds; after a failure the delay doubles up
+    to ``max_backoff`` so quota errors are not hammered.  Call ``wake`` after
+    recording an entry to push it straight away; it is ignored while backing
+    off, and the entry goes out with the next retry.
+    """
+
+    def __init__(self, journal, interval=5.0, max_backoff=300.0, shards=None):
+        super().__init__(name="crm-journal-replayer", daemon=True)
+        self.journal = journal
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.shards = shards
+        self.gc = None
+        self.identity = None
+        self.last_error = None
+        self.on_synced = None
+        self._delay = interval
+        self._worksheets = {}
+        self._wake = threading.Event()
+
+    def set_client(self, gc, identity):
+        """Use ``gc`` for pushes when ``identity`` (e.g. the service account email) changes"""
+        if gc is None or (identity is not None and identity == self.identity):
+            return
+        self.gc = gc
+        self.identity = identity
+        self._worksheets = {}
+        self.wake()
+
+    def wake(self):
+        if self._delay <= self.interval:
+            self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self._delay)
+            self._wake.clear()
+            if self.gc is None:
+                continue
+            try:
+                pushed, error = replay_journal(
+                    self.gc, self.journal, self.shards, worksheets=self._worksheets
+                )
+            except Exception as e:
+                logger.exception("Journal replay failed")
+                pushed, error = 0, f"Error replaying journal: {str(e)}"
+            self.last_error = error
+            if pushed and self.on_synced:
+                try:
+                    self.on_synced()
+                except Exception:
+                    logger.exception("Journal on_synced callback failed")
+            self._delay = min(self._delay * 2, self.max_backoff) if error else self.interval
@@ -0,0 +1,99 @@
+"""Opt-in process-pool cleaning for large client frames.
+
+The frame is split into contiguous row chunks and each chunk is run through
+``crm_data.clean_client_data`` in a worker process.  Workers are forked after
+the source frame has been published in a module global, so they read their
+chunk straight out of the parent's (copy-on-write) memory; only the
+``(start, stop)`` bounds are pickled on the way in.
+
+On the way back each worker returns only the CLEANED_FIELDS columns (7 of
+28); the untouched columns are taken from the parent's frame.  Those cleaned
+columns are still pickled: they are object (string) columns, which cannot be
+shared through numpy or shared-memory buffers without serialising them
+anyway.
+
+Cost breakdown at 200k rows, measured on a 1-CPU container (so every part
+runs back to back): serial clean 0.71-1.0s; pool overhead 1.3s, of which
+~0.2s is serial work in the parent (unpickling results, assigning columns)
+and ~1.05s is per-row work in the workers (copy-on-write page copies from
+touching the inherited object columns, pickling results), which real cores
+would share.  That models the pool at ``0.05 + 0.26 + 1.75 / cores`` seconds
+against ~0.71s serial: no gain below ~4 cores, break-even around 160k rows
+on 4 cores and 35k rows on 8.  Hence the PARALLEL_MIN_CPUS and
+PARALLEL_MIN_ROWS gates below.  These thresholds are derived from that
+model, not from a multi-core run; re-check them with ``bench_clean.py`` on
+the target host.
+
+Output is identical to the serial path.  The one column whose result depends on
+the whole frame is ``date_of_birth``: its format is detected from the first
+non-empty value, so it is detected once here and handed to every chunk
+explicitly.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from crm_data import CLEANED_FIELDS, clean_client_data, infer_date_format
+
+# Below these the pool costs more than it saves (see the module docstring)
+PARALLEL_MIN_ROWS = 200_000
+PARALLEL_MIN_CPUS = 4
+
+# Frame being cleaned, inherited by forked workers
+_source_df = None
+
+
+def _clean_chunk(bounds):
+    start, stop, date_format = bounds
+    cleaned = clean_client_data(_source_df.iloc[start:stop], date_format=date_format)
+    return cleaned[[field for field in CLEANED_FIELDS if field in cleaned.columns]]
+
+
+def _chunk_bounds(n_rows, workers, chunk_rows=None):
+    if not chunk_rows:
+        chunk_rows = -(-n_rows // workers)
+    return [(start, min(start + chunk_rows, n_rows)) for start in range(0, n_rows, chunk_rows)]
+
+
+def clean_client_data_parallel(df, workers=None, chunk_rows=None, min_rows=PARALLEL_MIN_ROWS,
+                               min_cpus=PARALLEL_MIN_CPUS):
+    """Clean ``df`` in a process pool, falling back to the serial path for small
+    frames and hosts with fewer than ``min_cpus`` CPUs"""
+    global _source_df
+
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    if (
+        workers < 2
+        or cpus < min_cpus
+        or len(df) < min_rows
+        or "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        return clean_client_data(df)
+
+    date_format = None
+    if 'date_of_birth' in df.columns:
+        date_format = infer_date_format(df['date_of_birth'].to_numpy())
+
+    bounds = [
+        (start, stop, date_format)
+        for start, stop in _chunk_bounds(len(df), workers, chunk_rows)
+    ]
+
+    _source_df = df
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(bounds)),
+            mp_context=multiprocessing.get_context("fork"),
+        ) as pool:
+            chunks = list(pool.map(_clean_chunk, bounds))
+    finally:
+        _source_df = None
+
+    cleaned = pd.concat(chunks)
+    df_clean = df.copy()
+    for field in cleaned.columns:
+        df_clean[field] = cleaned[field]
+    return df_clean
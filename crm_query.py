@@ -0,0 +1,242 @@
+"""Cached client list queries (segment, search and sort) shared by every session.
+
+A query result is an array of row ids into a ClientSnapshot.  ``QueryCache``
+keeps the most recently used results in a bounded LRU keyed by
+``(data version, segment, search term, sort field)``, so reruns that only
+change the selected client reuse the previous result instead of filtering and
+sorting again.
+
+Search is a case-insensitive substring match, so the rows matching "smit"
+are a subset of the rows matching "smi"; a search that extends a cached term
+narrows that cached result rather than scanning the whole table.
+
+Sorting uses ``SortIndex``: for each of SORT_FIELDS a permutation of the
+snapshot's rows by case-folded collation key is computed once per version
+(and patched incrementally when rows are appended or changed), so ordering a
+filtered result is a linear pass over that permutation instead of a string
+sort.  The select-box label of every client is likewise built once per
+version (``client_labels``).
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from crm_data import CLIENT_FIELDS
+from crm_segments import segment_index, segment_key
+from crm_store import LRUCache
+
+QUERY_CACHE_SIZE = int(os.environ.get("CRM_QUERY_CACHE_SIZE", "256"))
+
+# Fields offered in the "Sort by" box
+SORT_FIELDS = ["full_name", "email", "company_id", "first_name", "last_name"]
+
+
+def search_rows(df, row_ids, term):
+    """The ``row_ids`` whose row contains ``term`` in any client field (case-insensitive).
+
+    Only CLIENT_FIELDS are searched, not derived columns such as
+    DATE_DISPLAY_FIELD (which would make "mar" match every March birthday).
+    """
+    if not len(row_ids):
+        return row_ids
+    fields = [field for field in CLIENT_FIELDS if field in df.columns]
+    mask = df[fields].iloc[row_ids].astype(str).apply(
+        lambda x: x.str.contains(term, case=False, na=False, regex=False)
+    ).any(axis=1)
+    return row_ids[mask.to_numpy()]
+
+
+def collation_keys(column):
+    """Case-folded sort keys for a column; empty values sort last"""
+    text = column.fillna("").astype(str).str.strip().str.casefold()
+    return np.where(text == "", "1", "0" + text).astype(object)
+
+
+class SortIndex:
+    """Per-field row permutations of one ClientSnapshot, built lazily"""
+
+    def __init__(self, snapshot, fields=None):
+        self.snapshot = snapshot
+        # field -> (sorted keys, order, rank); order[i] is the row at sort position i
+        self._fields = dict(fields or {})
+        self._lock = threading.Lock()
+
+    def _field(self, field):
+        entry = self._fields.get(field)
+        if entry is None:
+            with self._lock:
+                entry = self._fields.get(field)
+                if entry is None:
+                    keys = collation_keys(self.snapshot.df[field])
+                    order = np.argsort(keys, kind="stable")
+                    entry = self._fields[field] = self._entry(keys[order], order)
+        return entry
+
+    @staticmethod
+    def _entry(sorted_keys, order):
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return sorted_keys, order, rank
+
+    def order(self, field, row_ids=None):
+        """``row_ids`` (default all rows) ordered by ``field``"""
+        _, order, rank = self._field(field)
+        if row_ids is None:
+            return order
+        if len(row_ids) * 16 < len(order):
+            # Few rows: sorting their integer ranks is cheaper than a full pass
+            return row_ids[np.argsort(rank[row_ids], kind="stable")]
+        selected = np.zeros(len(order), dtype=bool)
+        selected[row_ids] = True
+        return order[selected[order]]
+
+    @staticmethod
+    def _insert_at(sorted_keys, order, changed_keys, changed_ids):
+        """Positions inserting ``(key, row id)`` pairs where a stable argsort puts them.
+
+        Ties are ordered by row id, so within each run of equal keys the
+        position is found by row id rather than after the whole run.
+        """
+        lo = np.searchsorted(sorted_keys, changed_keys, side="left")
+        hi = np.searchsorted(sorted_keys, changed_keys, side="right")
+        at = lo.copy()
+        for i in np.flatnonzero(hi > lo):
+            at[i] += np.searchsorted(order[lo[i]:hi[i]], changed_ids[i])
+        return at
+
+    def apply_changes(self, snapshot, changed_ids, previous_positions):
+        """Index for ``snapshot``: keep the order of unchanged rows, insert changed ones.
+
+        The result matches a fresh build (``argsort(kind="stable")``: by key,
+        then row id).
+        """
+        kept = np.flatnonzero(previous_positions >= 0)
+        old_to_new = np.full(len(self.snapshot.df), -1, dtype=np.int64)
+        old_to_new[previous_positions[kept]] = kept
+        changed_ids = np.sort(np.asarray(changed_ids, dtype=np.int64))
+
+        updated = {}
+        for field, (sorted_keys, order, _) in self._fields.items():
+            new_ids = old_to_new[order]
+            still_there = new_ids >= 0
+            sorted_keys, order = sorted_keys[still_there], new_ids[still_there]
+            ties = sorted_keys[1:] == sorted_keys[:-1]
+            if (ties & (order[1:] < order[:-1])).any():
+                # Duplicate rows re-paired out of order: re-sort each run of equal keys by row id
+                runs = np.concatenate([[0], np.cumsum(~ties)])
+                order = order[np.lexsort((order, runs))]
+            if len(changed_ids):
+                changed_keys = collation_keys(snapshot.df[field].iloc[changed_ids])
+                by_key = np.argsort(changed_keys, kind="stable")
+                changed_keys, ids = changed_keys[by_key], changed_ids[by_key]
+                at = self._insert_at(sorted_keys, order, changed_keys, ids)
+                sorted_keys = np.insert(sorted_keys, at, changed_keys)
+                order = np.insert(order, at, ids)
+            updated[field] = self._entry(sorted_keys, order)
+        return SortIndex(snapshot, updated)
+
+
+def sort_index(snapshot):
+    """The SortIndex of a ClientSnapshot, built once per version"""
+    return snapshot.derive("sort", SortIndex)
+
+
+def label_strings(df, completeness):
+    """Select-box label of every row: status dot, name, email, company, completeness"""
+    def text(field):
+        if field not in df.columns:
+            return pd.Series([""] * len(df), index=df.index)
+        return df[field].fillna("").astype(str).str.strip()
+
+    completeness = pd.Series(completeness, index=df.index)
+    status = pd.Series(
+        np.select([completeness >= 80, completeness >= 50], ["🟢", "🟡"], "🔴"), index=df.index
+    )
+    labels = (
+        status + " " + text("full_name") + " (" + text("email") + ") - " + text("company_id")
+        + " [" + completeness.map("{:.0f}".format) + "% complete]"
+    )
+    return labels.to_numpy(dtype=object)
+
+
+class ClientLabels:
+    """Labels of one ClientSnapshot, rebuilt only for changed rows"""
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def apply_changes(self, snapshot, changed_ids, previous_positions):
+        labels = np.empty(len(snapshot.df), dtype=object)
+        kept = np.flatnonzero(previous_positions >= 0)
+        labels[kept] = self.labels[previous_positions[kept]]
+        if len(changed_ids):
+            labels[changed_ids] = label_strings(
+                snapshot.df.iloc[changed_ids], snapshot.completeness[changed_ids]
+            )
+        return ClientLabels(labels)
+
+
+def client_labels(snapshot):
+    """Label array of a ClientSnapshot (indexed by row id), built once per version"""
+    return snapshot.derive(
+        "labels", lambda snap: ClientLabels(label_strings(snap.df, snap.completeness))
+    ).labels
+
+
+class QueryCache:
+    """Bounded LRU of query results (read-only row id arrays)"""
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self._cache = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        return self._cache.get(key)
+
+    def _put(self, key, row_ids):
+        row_ids.setflags(write=False)
+        return self._cache.put(key, row_ids)
+
+    def _filtered(self, snapshot, segment, term):
+        version = snapshot.version
+        seg = segment_key(segment) if segment else None
+        row_ids = self._get((version, seg, term, None))
+        if row_ids is not None:
+            return row_ids
+
+        if not term:
+            if segment:
+                row_ids = segment_index(snapshot).row_ids(segment)
+            else:
+                row_ids = snapshot.row_ids
+            return self._put((version, seg, term, None), row_ids)
+
+        # Narrow the longest cached prefix of the term, if any
+        for end in range(len(term) - 1, -1, -1):
+            base = self._get((version, seg, term[:end], None))
+            if base is not None:
+                break
+        else:
+            base = self._filtered(snapshot, segment, "")
+        return self._put((version, seg, term, None), search_rows(snapshot.df, base, term))
+
+    def query(self, snapshot, search_term="", sort_by=None, segment=None):
+        """Row ids in ``segment`` matching ``search_term``, ordered by ``sort_by``"""
+        term = (search_term or "").lower()
+        key = (snapshot.version, segment_key(segment) if segment else None, term, sort_by)
+        row_ids = self._get(key)
+        if row_ids is not None:
+            self.hits += 1
+            return row_ids
+
+        self.misses += 1
+        row_ids = self._filtered(snapshot, segment, term)
+        if sort_by and sort_by in snapshot.df.columns:
+            row_ids = self._put(key, sort_index(snapshot).order(sort_by, row_ids))
+        return row_ids
+
+    def stats(self):
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
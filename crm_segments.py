@@ -0,0 +1,214 @@
+"""Saved client segments with incrementally maintained membership.
+
+A segment is a named list of conditions over CLIENT_FIELDS (and the derived
+``completeness`` score), all of which must hold.  Definitions are saved as JSON
+in ``CRM_SEGMENTS_PATH``:
+
+    {"name": "Incomplete profiles in Canada",
+     "conditions": [{"field": "country", "op": "equals", "value": "Canada"},
+                    {"field": "completeness", "op": "lt", "value": 80}]}
+
+Each segment compiles to a vectorized boolean mask.  ``SegmentIndex`` keeps
+the resulting membership as row-id sets for one snapshot; when rows are
+appended or changed it re-evaluates only those rows (``apply_changes``), so a
+saved audience is an instant filter instead of a rescan.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from crm_data import CLIENT_FIELDS
+
+SEGMENTS_PATH = os.environ.get("CRM_SEGMENTS_PATH", "crm_segments.json")
+
+SEGMENT_FIELDS = CLIENT_FIELDS + ["completeness"]
+
+# op -> label shown in the segment editor
+SEGMENT_OPS = {
+    "equals": "equals",
+    "contains": "contains",
+    "startswith": "starts with",
+    "empty": "is empty",
+    "not_empty": "is not empty",
+    "lt": "less than",
+    "gte": "at least",
+}
+NUMERIC_OPS = {"lt", "gte"}
+VALUELESS_OPS = {"empty", "not_empty"}
+
+
+def validate_segment(segment):
+    """Return a list of problems with a segment definition"""
+    errors = []
+    if not str(segment.get("name", "")).strip():
+        errors.append("Segment name is required")
+    conditions = segment.get("conditions") or []
+    if not conditions:
+        errors.append("At least one condition is required")
+    for condition in conditions:
+        field, op = condition.get("field"), condition.get("op")
+        if field not in SEGMENT_FIELDS:
+            errors.append(f"Unknown field: {field}")
+        if op not in SEGMENT_OPS:
+            errors.append(f"Unknown operator: {op}")
+        elif op in NUMERIC_OPS:
+            try:
+                float(condition.get("value"))
+            except (TypeError, ValueError):
+                errors.append(f"'{SEGMENT_OPS[op]}' needs a number")
+        elif op not in VALUELESS_OPS and not str(condition.get("value", "")).strip():
+            errors.append(f"'{SEGMENT_OPS[op]}' needs a value")
+    return errors
+
+
+def segment_key(segment):
+    """Stable key of a definition; edits to a segment produce a new key"""
+    payload = json.dumps(segment.get("conditions", []), sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _condition_mask(df, completeness, condition):
+    field, op, value = condition["field"], condition["op"], condition.get("value")
+
+    if field == "completeness":
+        values = np.asarray(completeness, dtype=float)
+        if op == "lt":
+            return values < float(value)
+        if op == "gte":
+            return values >= float(value)
+        text = pd.Series(values).map(lambda v: f"{v:.0f}")
+    else:
+        column = df[field] if field in df.columns else pd.Series([""] * len(df), index=df.index)
+        if op in NUMERIC_OPS:
+            numbers = pd.to_numeric(column, errors="coerce").to_numpy()
+            with np.errstate(invalid="ignore"):
+                return numbers < float(value) if op == "lt" else numbers >= float(value)
+        text = column.astype(str).where(column.notna(), "")
+
+    text = text.str.strip().str.lower()
+    is_empty = text.isin(["", "nan", "none", "null", "nat"]).to_numpy()
+    if op == "empty":
+        return is_empty
+    if op == "not_empty":
+        return ~is_empty
+
+    needle = str(value).strip().lower()
+    if op == "equals":
+        return (text == needle).to_numpy()
+    if op == "contains":
+        return text.str.contains(needle, regex=False).to_numpy()
+    return text.str.startswith(needle).to_numpy()
+
+
+def segment_mask(df, completeness, segment):
+    """Vectorized boolean mask of the rows of ``df`` matching every condition"""
+    mask = np.ones(len(df), dtype=bool)
+    for condition in segment.get("conditions", []):
+        mask &= np.asarray(_condition_mask(df, completeness, condition), dtype=bool)
+    return mask
+
+
+class SegmentIndex:
+    """Segment membership (row-id sets) for one ClientSnapshot.
+
+    Membership is computed lazily per segment and shared by all sessions
+    looking at the same snapshot.
+    """
+
+    def __init__(self, snapshot, members=None):
+        self.snapshot = snapshot
+        self._members = dict(members or {})
+        self._lock = threading.Lock()
+
+    def members(self, segment):
+        """Row ids in ``segment`` as a set"""
+        key = segment_key(segment)
+        entry = self._members.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._members.get(key)
+                if entry is None:
+                    mask = segment_mask(self.snapshot.df, self.snapshot.completeness, segment)
+                    entry = (segment, set(np.flatnonzero(mask).tolist()))
+                    self._members[key] = entry
+        return entry[1]
+
+    def row_ids(self, segment):
+        """Members in row order as an array, ready to use as a filter"""
+        return np.fromiter(sorted(self.members(segment)), dtype=np.int64)
+
+    def apply_changes(self, snapshot, changed_ids, previous_positions):
+        """Index for ``snapshot`` re-evaluating only ``changed_ids``.
+
+        Members of unchanged rows are carried over through
+        ``previous_positions`` (old row id of every new row, -1 if changed).
+        """
+        changed_ids = np.asarray(changed_ids, dtype=np.int64)
+        changed_df = snapshot.df.iloc[changed_ids]
+        changed_completeness = snapshot.completeness[changed_ids]
+
+        kept = np.flatnonzero(previous_positions >= 0)
+        old_to_new = np.full(len(self.snapshot.df), -1, dtype=np.int64)
+        old_to_new[previous_positions[kept]] = kept
+
+        updated = {}
+        for key, (segment, members) in self._members.items():
+            if members:
+                carried = old_to_new[np.fromiter(members, dtype=np.int64, count=len(members))]
+                members = set(carried[carried >= 0].tolist())
+            else:
+                members = set()
+            mask = segment_mask(changed_df, changed_completeness, segment)
+            members.update(changed_ids[mask].tolist())
+            updated[key] = (segment, members)
+        return SegmentIndex(snapshot, updated)
+
+
+def segment_index(snapshot):
+    """The SegmentIndex of a ClientSnapshot, built once per version"""
+    return snapshot.derive("segments", SegmentIndex)
+
+
+class SegmentStore:
+    """Saved segment definitions in a JSON file"""
+
+    def __init__(self, path=SEGMENTS_PATH):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write(self, segments):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(segments, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def save(self, segment):
+        """Add or replace (by name) a segment definition"""
+        errors = validate_segment(segment)
+        if errors:
+            return False, "; ".join(errors)
+        segments = [s for s in self.load() if s.get("name") != segment["name"]]
+        segments.append(segment)
+        try:
+            self._write(segments)
+        except Exception as e:
+            return False, f"Error saving segment: {str(e)}"
+        return True, f"Segment '{segment['name']}' saved"
+
+    def delete(self, name):
+        segments = [s for s in self.load() if s.get("name") != name]
+        try:
+            self._write(segments)
+        except Exception as e:
+            return False, f"Error deleting segment: {str(e)}"
+        return True, f"Segment '{name}' deleted"
@@ -0,0 +1,116 @@
+"""Spreadsheet sharding for the client table.
+
+A logical client table can be spread over several spreadsheets/worksheets
+(shards) to get past one spreadsheet's cell cap and per-sheet latency.  Reads
+fan out over a bounded thread pool and are merged into one frame; appends are
+routed to a shard by a stable hash of the client's email (``shard_for``).
+
+Shards are configured with the ``CRM_SHARDS`` environment variable, a comma
+separated list of ``sheet_id`` or ``sheet_id:worksheet`` entries.  Without it
+the single SHEET_ID spreadsheet is used, exactly as before.
+"""
+import os
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from crm_data import (
+    SHEET_ID, CLIENT_FIELDS, fetch_client_rows, finish_client_frame, safe_str,
+)
+
+# worksheet=None means "pick it the usual way" (WORKSHEET_NAMES, then first sheet)
+Shard = namedtuple("Shard", ["sheet_id", "worksheet"])
+
+# Upper bound on concurrent Sheets requests during a fan-out read
+MAX_SHARD_THREADS = 8
+
+
+def parse_shards(spec):
+    """Parse a ``sheet_id[:worksheet],...`` spec into a list of shards"""
+    shards = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        sheet_id, _, worksheet = entry.partition(":")
+        shards.append(Shard(sheet_id.strip(), worksheet.strip() or None))
+    return shards
+
+
+def configured_shards():
+    """Shards from ``CRM_SHARDS``, or the default single spreadsheet"""
+    return parse_shards(os.environ.get("CRM_SHARDS")) or [Shard(SHEET_ID, None)]
+
+
+def shard_label(shard):
+    return f"{shard.sheet_id[:8]}…/{shard.worksheet or 'auto'}"
+
+
+def _load_shard(gc, shard):
+    notices = []
+    started = time.perf_counter()
+    df, status = fetch_client_rows(gc, notices, shard.sheet_id, shard.worksheet)
+    report = {
+        "shard": shard_label(shard),
+        "rows": len(df),
+        "seconds": round(time.perf_counter() - started, 3),
+        "status": status,
+    }
+    return df, report, notices
+
+
+def load_sharded_client_data(gc, shards=None, notices=None, workers=None,
+                             max_threads=MAX_SHARD_THREADS, clean=True):
+    """Load every shard concurrently and merge them into one cleaned frame.
+
+    Returns ``(df, status, shard_report)`` where ``shard_report`` holds one
+    ``{"shard", "rows", "seconds", "status"}`` dict per shard.  Shards that
+    fail are reported and skipped; the load only fails when every shard does.
+    With ``clean=False`` the merged raw sheet values are returned instead.
+    """
+    shards = shards or configured_shards()
+    if notices is None:
+        notices = []
+
+    if not gc:
+        return pd.DataFrame(columns=CLIENT_FIELDS), "No authentication", []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_threads, len(shards)))) as pool:
+        results = list(pool.map(lambda shard: _load_shard(gc, shard), shards))
+
+    frames, shard_report = [], []
+    for df, report, shard_notices in results:
+        shard_report.append(report)
+        if len(shards) == 1:
+            notices.extend(shard_notices)
+        if report["status"] == "Success":
+            frames.append(df)
+        elif len(shards) > 1:
+            notices.append(("warning", f"Shard {report['shard']}: {report['status']}"))
+
+    if not frames:
+        status = shard_report[0]["status"] if len(shards) == 1 else "No shard could be loaded"
+        return pd.DataFrame(columns=CLIENT_FIELDS), status, shard_report
+
+    try:
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if not clean:
+            return df, "Success", shard_report
+        return finish_client_frame(df, workers), "Success", shard_report
+    except Exception as e:
+        error_msg = f"Error loading data: {str(e)[:200]}"
+        return pd.DataFrame(columns=CLIENT_FIELDS), error_msg, shard_report
+
+
+def shard_for(client_data, shards=None):
+    """Pick the shard a new client is written to.
+
+    Routing hashes the lower-cased email with CRC32, which (unlike ``hash``)
+    is stable across processes and restarts.
+    """
+    shards = shards or configured_shards()
+    key = safe_str(client_data.get("email", "")).lower()
+    return shards[zlib.crc32(key.encode("utf-8")) % len(shards)]
@@ -0,0 +1,141 @@
+"""Nearest-neighbour "similar clients" search over the DISC and behaviour fields.
+
+Each client is encoded once per data version into a compact float32 vector:
+
+* the DISC select fields are one-hot encoded on their D/I/S/C letter;
+* the free-text behaviour fields are hashed bag-of-words vectors
+  (``TEXT_BUCKETS`` buckets per field, CRC32 of each token).
+
+Every field block is L2-normalised, so the dot product of two rows is the sum
+of the per-field cosine similarities.  Dividing by the number of fields
+filled in both rows gives the mean cosine over what the two profiles have in
+common, so two identical profiles score 1.0 however sparse they are.  A query
+is two matrix-vector products plus an ``argpartition`` for the top k, a few
+milliseconds at 100k clients.
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+
+DISC_FIELDS = ["discprofile", "discsales", "disc_communiction", "leadership_style"]
+DISC_LETTERS = ["D", "I", "S", "C"]
+
+TEXT_FIELDS = [
+    "team_dynamics", "conflict_resolution", "customer_service_approach",
+    "decision_making_style", "workplace_behavior", "hiring_and_recruitment",
+    "_coaching_and_development",
+]
+TEXT_BUCKETS = 32
+
+_TOKEN_PATTERN = r"[a-z0-9]+"
+
+BLOCK_SIZES = [len(DISC_LETTERS)] * len(DISC_FIELDS) + [TEXT_BUCKETS] * len(TEXT_FIELDS)
+
+
+def _normalize_blocks(matrix, block_sizes):
+    start = 0
+    for size in block_sizes:
+        block = matrix[:, start:start + size]
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.divide(block, norms, out=block, where=norms > 0)
+        start += size
+    return matrix
+
+
+def _disc_block(column):
+    letters = column.fillna("").astype(str).str.strip().str[:1].str.upper()
+    return np.stack([(letters == letter).to_numpy() for letter in DISC_LETTERS], axis=1)
+
+
+def _text_block(column):
+    block = np.zeros((len(column), TEXT_BUCKETS), dtype=np.float32)
+    tokens = column.fillna("").astype(str).str.lower().str.findall(_TOKEN_PATTERN).explode().dropna()
+    if tokens.empty:
+        return block
+
+    # Hash each distinct token once, then scatter the counts
+    buckets = {token: zlib.crc32(token.encode("utf-8")) % TEXT_BUCKETS for token in tokens.unique()}
+    rows = tokens.index.to_numpy()
+    cols = tokens.map(buckets).to_numpy(dtype=np.int64)
+    np.add.at(block, (rows, cols), 1.0)
+    return block
+
+
+def encode_profiles(df):
+    """Encode the DISC/behaviour fields of ``df`` into a row-normalised matrix"""
+    df = df.reset_index(drop=True)
+    blocks, sizes = [], []
+
+    for field in DISC_FIELDS:
+        column = df[field] if field in df.columns else pd.Series([""] * len(df))
+        blocks.append(_disc_block(column).astype(np.float32))
+        sizes.append(len(DISC_LETTERS))
+
+    for field in TEXT_FIELDS:
+        column = df[field] if field in df.columns else pd.Series([""] * len(df))
+        blocks.append(_text_block(column))
+        sizes.append(TEXT_BUCKETS)
+
+    matrix = np.ascontiguousarray(np.hstack(blocks), dtype=np.float32)
+    return _normalize_blocks(matrix, sizes)
+
+
+def filled_fields(matrix):
+    """float32 ``(rows, fields)`` matrix, 1.0 where a field block is non-empty"""
+    starts = np.cumsum([0] + BLOCK_SIZES[:-1])
+    return np.stack(
+        [matrix[:, start:start + size].any(axis=1) for start, size in zip(starts, BLOCK_SIZES)],
+        axis=1,
+    ).astype(np.float32)
+
+
+def similar_clients(profiles, row_id, k=5):
+    """Top-k most similar rows to ``row_id`` as ``(row_ids, scores)``, best first.
+
+    Scores are the mean cosine over the fields both rows have filled, in
+    [0, 1].  Rows with nothing in common (score 0) are left out.
+    """
+    matrix, filled = profiles.matrix, profiles.filled
+    query = matrix[row_id]
+    if not query.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    shared = filled @ filled[row_id]
+    scores = np.divide(matrix @ query, shared, out=np.zeros_like(shared), where=shared > 0)
+    scores[row_id] = -np.inf
+
+    k = min(k, len(scores) - 1)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    top = np.argpartition(scores, -k)[-k:]
+    top = top[np.argsort(scores[top])[::-1]]
+    top = top[scores[top] > 0]
+    return top, scores[top]
+
+
+class ProfileMatrix:
+    """Encoded profiles of one ClientSnapshot, re-encoding only changed rows"""
+
+    def __init__(self, matrix, filled=None):
+        self.matrix = matrix
+        self.filled = filled if filled is not None else filled_fields(matrix)
+
+    def apply_changes(self, snapshot, changed_ids, previous_positions):
+        matrix = np.empty((len(snapshot.df), self.matrix.shape[1]), dtype=np.float32)
+        filled = np.empty((len(snapshot.df), self.filled.shape[1]), dtype=np.float32)
+        kept = np.flatnonzero(previous_positions >= 0)
+        matrix[kept] = self.matrix[previous_positions[kept]]
+        filled[kept] = self.filled[previous_positions[kept]]
+        if len(changed_ids):
+            matrix[changed_ids] = encode_profiles(snapshot.df.iloc[changed_ids])
+            filled[changed_ids] = filled_fields(matrix[changed_ids])
+        return ProfileMatrix(matrix, filled)
+
+
+def profile_matrix(snapshot):
+    """The encoded ProfileMatrix for a ClientSnapshot, built once per version"""
+    return snapshot.derive(
+        "similar_clients", lambda snap: ProfileMatrix(encode_profiles(snap.df))
+    )
@@ -0,0 +1,292 @@
+"""Pluggable storage backends for the client table.
+
+``StorageBackend`` is the interface the app talks to:
+
+* ``load(notices)`` -> ``(df, status)`` with the full, cleaned client frame
+* ``load_range(offset, limit, search, order_by)`` -> one cleaned page
+* ``append_batch(records)`` -> ``(success, message)``
+* ``update_cells(updates)`` -> ``(success, message)``; SQLite only, since
+  Sheets rows have no stable address between loads
+* ``version()`` -> a cheap token that changes whenever the data does (None
+  for Sheets, which has no change token short of a Drive metadata read)
+
+``GoogleSheetsBackend`` is the existing Sheets behaviour (sharded reads,
+column-projected fetches).  ``SQLiteBackend`` is an indexed local engine that
+pushes search, ordering and pagination down to SQL; large deployments can run
+on it and sync to Sheets only for sharing.  ``crm_sync.py`` does not go through
+the interface: it reads the sheet with ``load_sharded_client_data`` and
+mirrors it locally with ``SQLiteBackend.replace_all`` (``--sqlite``).
+
+Row ids are positions in the frame returned by ``load``; ``load_range`` pages
+are indexed by the same positions and ``update_cells`` takes them.
+"""
+import contextlib
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from crm_data import (
+    CLIENT_FIELDS, open_client_worksheet, build_sheet_row,
+    finish_client_frame, safe_str,
+)
+from crm_shards import configured_shards, load_sharded_client_data, shard_for
+
+BACKEND = os.environ.get("CRM_BACKEND", "sheets")
+SQLITE_PATH = os.environ.get("CRM_SQLITE_PATH", "crm_clients.sqlite3")
+
+# Fields the SQLite engine keeps a case-insensitive index on
+INDEXED_FIELDS = ["email", "company_id", "full_name", "first_name", "last_name"]
+
+
+def _check_field(field):
+    if field not in CLIENT_FIELDS:
+        raise ValueError(f"Unknown client field: {field}")
+    return field
+
+
+def _to_text(value):
+    text = safe_str(value)
+    if text and hasattr(value, "strftime"):
+        return value.strftime('%Y-%m-%d')
+    return text
+
+
+class StorageBackend:
+    """Interface implemented by every storage engine"""
+
+    name = "base"
+    workers = None
+
+    def load_raw(self, notices=None):
+        """``(df, status)`` with the stored values, before cleaning"""
+        raise NotImplementedError
+
+    def load(self, notices=None):
+        df, status = self.load_raw(notices)
+        if status != "Success":
+            return df, status
+        try:
+            return finish_client_frame(df, self.workers).reset_index(drop=True), status
+        except Exception as e:
+            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error loading data: {str(e)[:200]}"
+
+    def load_range(self, offset=0, limit=100, search=None, order_by=None):
+        """One page of clients, optionally filtered and ordered.
+
+        The default implementation filters the full frame in memory; engines
+        that can do better override it.
+        """
+        df, status = self.load()
+        if search:
+            fields = [field for field in CLIENT_FIELDS if field in df.columns]
+            mask = df[fields].astype(str).apply(
+                lambda x: x.str.contains(search, case=False, na=False, regex=False)
+            ).any(axis=1)
+            df = df[mask]
+        if order_by:
+            df = df.sort_values(_check_field(order_by), key=lambda s: s.astype(str).str.lower())
+        return df.iloc[offset:offset + limit]
+
+    def append_batch(self, records):
+        raise NotImplementedError
+
+    def update_cells(self, updates):
+        """Apply ``(row_id, field, value)`` updates"""
+        raise NotImplementedError
+
+    def version(self):
+        """A cheap token that changes whenever the data does, or None if the engine has none"""
+        return None
+
+
+class GoogleSheetsBackend(StorageBackend):
+    """The Google Sheets client table, possibly spread over several shards"""
+
+    name = "sheets"
+
+    def __init__(self, gc, shards=None, workers=None):
+        self.gc = gc
+        self.shards = shards or configured_shards()
+        self.workers = workers
+        self.shard_report = []
+
+    def load_raw(self, notices=None):
+        df, status, self.shard_report = load_sharded_client_data(
+            self.gc, self.shards, notices, clean=False
+        )
+        return df.reset_index(drop=True), status
+
+    def append_batch(self, records):
+        if not records:
+            return True, "Nothing to add"
+        try:
+            by_shard = {}
+            for record in records:
+                by_shard.setdefault(shard_for(record, self.shards), []).append(record)
+
+            for shard, shard_records in by_shard.items():
+                worksheet = open_client_worksheet(self.gc, sheet_id=shard.sheet_id, worksheet_name=shard.worksheet)
+                if not worksheet:
+                    return False, "No worksheets found"
+                headers = worksheet.row_values(1) or CLIENT_FIELDS
+                worksheet.append_rows([build_sheet_row(headers, record) for record in shard_records])
+            return True, f"Added {len(records)} clients"
+        except Exception as e:
+            return False, f"Error adding clients: {str(e)}"
+
+
+class SQLiteBackend(StorageBackend):
+    """Indexed local client table in a SQLite file"""
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        columns = ", ".join(f'"{field}" TEXT NOT NULL DEFAULT \'\'' for field in CLIENT_FIELDS)
+        indexes = "\n".join(
+            f'CREATE INDEX IF NOT EXISTS clients_{field} ON clients ("{field}" COLLATE NOCASE);'
+            for field in INDEXED_FIELDS
+        )
+        with self._connect() as conn:
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS clients (row_id INTEGER PRIMARY KEY, {columns});
+                {indexes}
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0');
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'version'",
+            (str(time.time_ns()),),
+        )
+
+    def load_raw(self, notices=None):
+        try:
+            with self._connect() as conn:
+                df = pd.read_sql_query(
+                    f'SELECT {self._select_list()} FROM clients ORDER BY row_id', conn
+                )
+        except Exception as e:
+            return pd.DataFrame(columns=CLIENT_FIELDS), f"Error loading data: {str(e)[:200]}"
+        if df.empty:
+            return pd.DataFrame(columns=CLIENT_FIELDS), "No data rows found (only headers or empty)"
+        return df, "Success"
+
+    @staticmethod
+    def _select_list():
+        return ", ".join(f'"{field}"' for field in CLIENT_FIELDS)
+
+    @staticmethod
+    def _where(search):
+        if not search:
+            return "", []
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clause = " OR ".join(f'"{field}" LIKE ? ESCAPE \'\\\'' for field in CLIENT_FIELDS)
+        return f" WHERE {clause}", [pattern] * len(CLIENT_FIELDS)
+
+    def count(self, search=None):
+        where, params = self._where(search)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM clients{where}", params).fetchone()[0]
+
+    def load_range(self, offset=0, limit=100, search=None, order_by=None):
+        """One page of clients; filtering, ordering and paging run in SQLite.
+
+        The page is indexed by row position (0-based, as in ``load``), not by
+        the SQLite ``row_id``, so its index can be passed to ``update_cells``.
+        """
+        where, params = self._where(search)
+        order = f'"{_check_field(order_by)}" COLLATE NOCASE, row_id' if order_by else "row_id"
+        with self._connect() as conn:
+            # One read transaction so the page and its positions agree
+            conn.execute("BEGIN")
+            raw = pd.read_sql_query(
+                f"SELECT row_id, {self._select_list()} FROM clients{where} "
+                f"ORDER BY {order} LIMIT ? OFFSET ?",
+                conn, params=params + [limit, offset], index_col="row_id",
+            )
+            if raw.empty:
+                return pd.DataFrame(columns=CLIENT_FIELDS)
+            row_ids = raw.index.tolist()
+            positions = dict(conn.execute(
+                "SELECT row_id, position FROM ("
+                "SELECT row_id, ROW_NUMBER() OVER (ORDER BY row_id) - 1 AS position FROM clients"
+                f") WHERE row_id IN ({', '.join('?' for _ in row_ids)})",
+                row_ids,
+            ).fetchall())
+        raw.index = [positions[row_id] for row_id in row_ids]
+        return finish_client_frame(raw[CLIENT_FIELDS])
+
+    def append_batch(self, records):
+        if not records:
+            return True, "Nothing to add"
+        placeholders = ", ".join("?" for _ in CLIENT_FIELDS)
+        rows = [[_to_text(record.get(field, "")) for field in CLIENT_FIELDS] for record in records]
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    f"INSERT INTO clients ({self._select_list()}) VALUES ({placeholders})", rows
+                )
+                self._bump_version(conn)
+            return True, f"Added {len(records)} clients"
+        except Exception as e:
+            return False, f"Error adding clients: {str(e)}"
+
+    def update_cells(self, updates):
+        if not updates:
+            return True, "Nothing to update"
+        try:
+            with self._connect() as conn:
+                row_ids = [row[0] for row in conn.execute("SELECT row_id FROM clients ORDER BY row_id")]
+                for row_id, field, value in updates:
+                    conn.execute(
+                        f'UPDATE clients SET "{_check_field(field)}" = ? WHERE row_id = ?',
+                        (_to_text(value), row_ids[row_id]),
+                    )
+                self._bump_version(conn)
+            return True, f"Updated {len(updates)} cells"
+        except Exception as e:
+            return False, f"Error updating clients: {str(e)}"
+
+    def replace_all(self, df):
+        """Replace the whole table with ``df`` (used to mirror the sheet locally)"""
+        placeholders = ", ".join("?" for _ in CLIENT_FIELDS)
+        rows = [
+            [_to_text(value) for value in row]
+            for row in df.reindex(columns=CLIENT_FIELDS).itertuples(index=False, name=None)
+        ]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM clients")
+            conn.executemany(
+                f"INSERT INTO clients ({self._select_list()}) VALUES ({placeholders})", rows
+            )
+            self._bump_version(conn)
+        return len(rows)
+
+    def version(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+
+def get_storage_backend(gc=None, backend=None, **kwargs):
+    """The backend selected by ``backend`` or the CRM_BACKEND environment variable"""
+    backend = backend or BACKEND
+    if backend == "sqlite":
+        return SQLiteBackend(kwargs.get("path", SQLITE_PATH))
+    if backend == "sheets":
+        return GoogleSheetsBackend(gc, kwargs.get("shards"), kwargs.get("workers"))
+    raise ValueError(f"Unknown storage backend: {backend}")
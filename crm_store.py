@@ -0,0 +1,337 @@
+"""Process-wide, versioned client snapshot shared by every session.
+
+Streamlit sessions used to keep their own copy of the client frame in
+``st.session_state``, so memory grew with sessions × rows.  ``ClientStore``
+holds a single ``ClientSnapshot`` per process instead; sessions keep a reference
+to it plus their own small arrays of row ids (filter results), never a frame.
+
+Snapshots are immutable by convention: code that needs a different frame
+builds a new one and publishes it as a new version instead of mutating
+``snapshot.df`` in place.  Row ids are positions in ``snapshot.df``, whose
+index is reset to ``0..n-1`` when the snapshot is published.
+
+Refreshes are incremental.  Every raw row is fingerprinted with a content
+hash at load time; ``ClientStore.publish_raw`` matches the new fingerprints
+against the previous version's, cleans only added or modified rows, and
+carries completeness and derived structures over for the rest, so refresh
+cost follows the number of changed rows rather than the size of the CRM.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from crm_data import (
+    CLIENT_FIELDS, build_sheet_row, clean_client_data, completeness_scores,
+    finish_client_frame, infer_date_format, row_fingerprints,
+)
+
+# Seconds a snapshot is served before the next ``get`` reloads it, including
+# empty or failed loads so a sheet outage is not refetched on every rerun
+DEFAULT_MAX_AGE = 60
+
+
+class ClientSnapshot:
+    """One immutable version of the client table and its derived data"""
+
+    __slots__ = (
+        "version", "df", "status", "shard_report", "notices", "loaded_at",
+        "completeness", "row_hashes", "date_format", "_derived", "_derive_lock",
+    )
+
+    def __init__(self, version, df, status, shard_report=(), notices=(), loaded_at=None,
+                 completeness=None, row_hashes=None, date_format=None):
+        self.version = version
+        self.df = df
+        self.status = status
+        self.shard_report = list(shard_report)
+        self.notices = list(notices)
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        if completeness is None:
+            completeness = completeness_scores(df) if len(df) else np.zeros(0)
+        self.completeness = completeness
+        # Fingerprints of the raw rows this version was cleaned from
+        self.row_hashes = row_hashes
+        self.date_format = date_format
+        self._derived = {}
+        self._derive_lock = threading.Lock()
+
+    def derive(self, key, builder):
+        """Build ``builder(self)`` once per snapshot and share it between sessions.
+
+        Use this for indexes and other structures computed from ``df``; they
+        live exactly as long as this version of the data.  A derived value with
+        an ``apply_changes(snapshot, changed_ids, previous_positions)`` method
+        is carried over to the next version when only some rows changed (see
+        ClientStore.publish); it must return an updated copy rather than
+        mutate itself.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._derive_lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+            return self._derived[key]
+
+    def refreshed(self, shard_report=(), notices=()):
+        """The same version reloaded just now: a new snapshot sharing data and derived values"""
+        snapshot = ClientSnapshot(
+            self.version, self.df, self.status, shard_report, notices,
+            completeness=self.completeness, row_hashes=self.row_hashes,
+            date_format=self.date_format,
+        )
+        snapshot._derived = self._derived
+        snapshot._derive_lock = self._derive_lock
+        return snapshot
+
+    @property
+    def row_ids(self):
+        return np.arange(len(self.df))
+
+    @property
+    def memory_bytes(self):
+        return self.derive(
+            "memory_bytes",
+            lambda snap: int(snap.df.memory_usage(deep=True).sum()) + snap.completeness.nbytes,
+        )
+
+
+def empty_snapshot(status):
+    """A version-0 snapshot with no rows, used when nothing can be loaded"""
+    return ClientSnapshot(0, pd.DataFrame(columns=CLIENT_FIELDS), status, loaded_at=0)
+
+
+def match_rows(previous_hashes, hashes):
+    """Old position of every new row with identical content, or -1.
+
+    Duplicate rows are paired up in order, so each old row is reused at most
+    once.
+    """
+    previous = pd.DataFrame({"hash": previous_hashes, "position": np.arange(len(previous_hashes))})
+    previous["occurrence"] = previous.groupby("hash").cumcount()
+    current = pd.DataFrame({"hash": hashes})
+    current["occurrence"] = current.groupby("hash").cumcount()
+    matched = current.merge(previous, on=["hash", "occurrence"], how="left")
+    return matched["position"].fillna(-1).to_numpy(dtype=np.int64)
+
+
+class ClientStore:
+    """Holds the current snapshot and reloads it at most once at a time.
+
+    ``loader`` passed to ``get`` is called with no arguments and returns the
+    raw (uncleaned) ``(df, status, shard_report, notices)``.  Concurrent
+    sessions asking for a reload wait on the same load rather than each
+    fetching the sheet.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+        self._stale = False
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def _is_fresh(self, snapshot, max_age):
+        if snapshot is None or self._stale:
+            return False
+        return (time.time() - snapshot.loaded_at) <= max_age
+
+    def get(self, loader, max_age=DEFAULT_MAX_AGE):
+        """Return the current snapshot, loading a new version once it is ``max_age`` seconds old"""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, max_age):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot, max_age):
+                return snapshot
+            raw, status, shard_report, notices = loader()
+            return self.publish_raw(raw, status, shard_report, notices)
+
+    def publish_raw(self, raw, status, shard_report=(), notices=()):
+        """Clean a freshly loaded raw frame and publish it.
+
+        Rows whose fingerprint matches a row of the current version reuse its
+        cleaned values; only added or modified rows go through the cleaner.
+        When nothing changed the same version is republished with a fresh
+        ``loaded_at`` (see ClientSnapshot.refreshed), so every cache keyed on
+        the version stays valid.
+        """
+        if status != "Success" or raw.empty:
+            return self.publish(pd.DataFrame(columns=CLIENT_FIELDS), status, shard_report, notices)
+
+        raw = raw.reset_index(drop=True)
+        hashes = row_fingerprints(raw)
+        date_format = None
+        if 'date_of_birth' in raw.columns:
+            date_format = infer_date_format(raw['date_of_birth'].to_numpy())
+
+        previous = self._snapshot
+        if (
+            previous is None
+            or previous.row_hashes is None
+            or date_format != previous.date_format
+        ):
+            # Nothing to diff against (or cleaned dates would differ): full clean
+            df = finish_client_frame(raw, self.workers)
+            return self.publish(
+                df, status, shard_report, notices, row_hashes=hashes, date_format=date_format
+            )
+
+        previous_positions = match_rows(previous.row_hashes, hashes)
+        if len(hashes) == len(previous.row_hashes) and np.array_equal(
+            previous_positions, np.arange(len(hashes))
+        ):
+            self._snapshot = previous.refreshed(shard_report, notices)
+            self._stale = False
+            return self._snapshot
+
+        kept = np.flatnonzero(previous_positions >= 0)
+        changed = np.flatnonzero(previous_positions < 0)
+        reused = previous.df.iloc[previous_positions[kept]]
+        if len(changed):
+            cleaned = clean_client_data(raw.iloc[changed], date_format=date_format)
+            parts = pd.concat([reused, cleaned], ignore_index=True) if len(kept) else cleaned
+            order = np.empty(len(raw), dtype=np.int64)
+            order[kept] = np.arange(len(kept))
+            order[changed] = np.arange(len(kept), len(raw))
+            df = parts.iloc[order]
+        else:
+            df = reused
+
+        return self.publish(
+            df, status, shard_report, notices,
+            previous_positions=previous_positions, row_hashes=hashes, date_format=date_format,
+        )
+
+    def publish(self, df, status, shard_report=(), notices=(), previous_positions=None,
+                row_hashes=None, date_format=None):
+        """Install a cleaned ``df`` as the next version and return its snapshot.
+
+        ``previous_positions`` gives, for every row of ``df``, the position of
+        the identical row in the current version, or -1 for added/modified
+        rows.  Completeness and derived structures are then updated for just
+        the changed rows instead of rebuilt.
+        """
+        df = df.reset_index(drop=True)
+        previous = self._snapshot
+        incremental = previous_positions is not None and previous is not None
+
+        completeness = None
+        changed_ids = None
+        if incremental:
+            previous_positions = np.asarray(previous_positions, dtype=np.int64)
+            kept = previous_positions >= 0
+            changed_ids = np.flatnonzero(~kept)
+            completeness = np.zeros(len(df))
+            completeness[kept] = previous.completeness[previous_positions[kept]]
+            if len(changed_ids):
+                completeness[changed_ids] = completeness_scores(df.iloc[changed_ids])
+
+        self._version += 1
+        snapshot = ClientSnapshot(
+            self._version, df, status, shard_report, notices, completeness=completeness,
+            row_hashes=row_hashes, date_format=date_format,
+        )
+
+        if incremental:
+            for key, value in list(previous._derived.items()):
+                if hasattr(value, "apply_changes"):
+                    snapshot._derived[key] = value.apply_changes(snapshot, changed_ids, previous_positions)
+
+        self._snapshot = snapshot
+        self._stale = False
+        return snapshot
+
+    def append_clients(self, records):
+        """Publish a new version with ``records`` appended to the current frame"""
+        with self._lock:
+            previous = self._snapshot
+            if previous is None:
+                return None
+            raw = pd.DataFrame(
+                [build_sheet_row(CLIENT_FIELDS, record) for record in records],
+                columns=CLIENT_FIELDS,
+            )
+            df = pd.concat(
+                [previous.df, clean_client_data(raw, date_format=previous.date_format)],
+                ignore_index=True,
+            )
+            row_hashes = None
+            if previous.row_hashes is not None:
+                row_hashes = np.concatenate([previous.row_hashes, row_fingerprints(raw)])
+            previous_positions = np.concatenate([
+                np.arange(len(previous.df)), np.full(len(raw), -1)
+            ])
+            # Appending to an empty or failed load leaves a table that loaded fine
+            status, notices = previous.status, previous.notices
+            if not df.empty and status != "Success":
+                status, notices = "Success", ()
+            return self.publish(
+                df, status, previous.shard_report, notices,
+                previous_positions=previous_positions, row_hashes=row_hashes,
+                date_format=previous.date_format,
+            )
+
+    def invalidate(self):
+        """Force the next ``get`` to reload"""
+        self._stale = True
+
+
+class LRUCache:
+    """Small thread-safe LRU for values shared between sessions.
+
+    Keys should include the snapshot version so entries of older versions
+    simply age out.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def session_memory_bytes(state):
+    """Approximate bytes held directly by one session's state values"""
+    total = 0
+    for value in state.values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            total += int(np.sum(value.memory_usage(deep=True)))
+        else:
+            total += sys.getsizeof(value)
+    return total
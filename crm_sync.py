@@ -0,0 +1,105 @@
+"""Headless sync/export for the Live CRM client sheet.
+
+Runs the same loader and cleaner as the Streamlit app without starting a UI
+session, so it can be scheduled from cron or a worker.  All shards configured
+in CRM_SHARDS are read (see crm_shards.py):
+
+    python crm_sync.py --credentials service_account.json --output clients.csv
+    python crm_sync.py -c sa.json -o snapshot.pkl --format snapshot
+    python crm_sync.py -c sa.json -o clients.csv --workers 16
+    python crm_sync.py -c sa.json --sqlite crm_clients.sqlite3
+"""
+import argparse
+import json
+import sys
+import time
+
+import crm_data
+from crm_shards import load_sharded_client_data
+from crm_storage import SQLiteBackend
+from crm_journal import ClientJournal, replay_journal
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Sync the CRM Google Sheet to a local snapshot or export file"
+    )
+    parser.add_argument("-c", "--credentials", required=True,
+                        help="Path to the Google service account JSON file")
+    parser.add_argument("-o", "--output",
+                        help="Destination file (.csv, .json, .xlsx or .pkl snapshot)")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="Mirror the sheet into this local SQLite database (CRM_BACKEND=sqlite)")
+    parser.add_argument("-f", "--format", choices=crm_data.EXPORT_FORMATS,
+                        help="Export format (inferred from the output extension by default)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Clean large sheets in a pool of this many processes")
+    parser.add_argument("--replay-journal", action="store_true",
+                        help="Push pending journaled client adds to the sheet before syncing")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only print errors")
+    return parser
+
+
+def run_sync(credentials_path, output_path, fmt=None, workers=None, replay=False,
+             sqlite_path=None, log=print):
+    """Load, clean and export the client sheet. Returns a process exit code."""
+    started = time.perf_counter()
+
+    try:
+        with open(credentials_path) as f:
+            creds_dict = json.load(f)
+        gc = crm_data.authorize(creds_dict)
+    except Exception as e:
+        print(f"Auth Error: {e}", file=sys.stderr)
+        return 2
+
+    if replay:
+        pushed, error = replay_journal(gc, ClientJournal())
+        log(f"Replayed {pushed} journaled clients")
+        if error:
+            print(f"Journal Replay Error: {error}", file=sys.stderr)
+
+    notices = []
+    df, load_status, shard_report = load_sharded_client_data(gc, notices=notices, workers=workers)
+    for level, text in notices:
+        log(f"[{level}] {text}")
+    for report in shard_report:
+        log(f"[shard] {report['shard']}: {report['rows']} rows in {report['seconds']}s ({report['status']})")
+
+    if load_status != "Success":
+        print(f"Data Loading Issue: {load_status}", file=sys.stderr)
+        return 1
+
+    if sqlite_path:
+        try:
+            rows = SQLiteBackend(sqlite_path).replace_all(df)
+        except Exception as e:
+            print(f"SQLite Error: {e}", file=sys.stderr)
+            return 1
+        log(f"Mirrored {rows} clients into {sqlite_path}")
+
+    if output_path:
+        try:
+            crm_data.export_clients(df, output_path, fmt)
+        except Exception as e:
+            print(f"Export Error: {e}", file=sys.stderr)
+            return 1
+        log(f"Wrote {len(df)} clients to {output_path}")
+
+    log(f"Sync finished in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.output and not args.sqlite:
+        parser.error("one of --output or --sqlite is required")
+    log = (lambda *a, **k: None) if args.quiet else print
+    return run_sync(args.credentials, args.output, args.format, workers=args.workers,
+                    replay=args.replay_journal, sqlite_path=args.sqlite, log=log)
+
+
+if __name__ == "__main__":
+    sys.exit(main())